@@ -0,0 +1,156 @@
+"""
+Perfilador por muestreo bajo demanda para los agentes del kiosko.
+
+`POST /v1/debug/profile?seconds=N&hz=R` muestrea las pilas de todos los
+hilos del proceso (monitor, lector evdev, workers de Flask, cola de
+impresión...) durante N segundos y devuelve el resultado en formato
+"collapsed stacks" (entrada de flamegraph.pl / speedscope). Con
+`format=json` se incluye además un volcado de hilos con su estado y, si
+están bloqueados en una primitiva de threading/queue escrita en Python
+(Condition, Event, Semaphore, Queue, join), en qué esperan.
+`GET /v1/debug/threads` devuelve solo el volcado.
+
+Las esperas dentro de C no generan frame propio: un hilo bloqueado en
+`Lock.acquire()` o `with lock:` sobre un Lock/RLock aparece como `running`
+en la línea que adquiere el lock (visible en su pila).
+
+Los endpoints solo se activan si `DEBUG_PROFILE_TOKEN` está definido y la
+petición envía el mismo valor en la cabecera `X-Debug-Token`. Fuera de una
+sesión de perfilado no hay hooks ni hilos: el coste es nulo.
+
+Módulo compartido por printer-agent y qr-scanner-agent: se copia junto a
+cada server.py al instalar (ver debian/rules e install.sh).
+"""
+
+import collections
+import hmac
+import os
+import sys
+import threading
+import time
+
+from flask import Response, jsonify, request
+
+MAX_SECONDS = 60
+MAX_HZ = 1000
+
+# Funciones Python de threading/queue en las que un hilo está bloqueado
+# esperando (Lock/RLock.acquire son C y no aparecen como frame)
+_WAIT_FUNCS = {
+    'wait': 'Condition/Event.wait',
+    'wait_for': 'Condition.wait_for',
+    'acquire': 'Semaphore.acquire',
+    '_wait_for_tstate_lock': 'Thread.join',
+    'join': 'Thread.join',
+    'get': 'Queue.get',
+}
+
+_SYNC_MODULES = ('threading.py', 'queue.py')
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)})'
+
+
+def _stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample(seconds, hz):
+    """Muestrea todas las pilas y devuelve (Counter de pilas colapsadas, nº de muestras)."""
+    me = threading.get_ident()
+    interval = 1.0 / hz
+    counts = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            thread = names.get(ident, f'thread-{ident}')
+            counts[';'.join([thread, *_stack(frame)])] += 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+
+def thread_dump():
+    """Estado de cada hilo: pila actual y, si está bloqueado, en qué espera."""
+    frames = sys._current_frames()
+    dump = []
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        state = 'running'
+        waiting_on = None
+        if frame is not None:
+            code = frame.f_code
+            if code.co_name in _WAIT_FUNCS and os.path.basename(code.co_filename) in _SYNC_MODULES:
+                state = 'waiting'
+                waiting_on = _WAIT_FUNCS[code.co_name]
+                # Primer llamador fuera de threading/queue: el código que espera
+                caller = frame.f_back
+                while caller is not None and os.path.basename(caller.f_code.co_filename) in _SYNC_MODULES:
+                    caller = caller.f_back
+                if caller is not None:
+                    waiting_on += f' at {os.path.basename(caller.f_code.co_filename)}:{caller.f_lineno}'
+        dump.append({
+            'name': thread.name,
+            'ident': thread.ident,
+            'daemon': thread.daemon,
+            'alive': thread.is_alive(),
+            'state': state,
+            'waiting_on': waiting_on,
+            'stack': _stack(frame) if frame is not None else [],
+        })
+    return dump
+
+
+def _authorized():
+    token = os.environ.get('DEBUG_PROFILE_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token)
+
+
+def register(app):
+    """Añade los endpoints /v1/debug/* a la aplicación Flask."""
+
+    @app.post('/v1/debug/profile')
+    def debug_profile():
+        if not _authorized():
+            return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+        seconds = min(max(request.args.get('seconds', default=5, type=float), 0.1), MAX_SECONDS)
+        hz = min(max(request.args.get('hz', default=float(os.environ.get('DEBUG_PROFILE_HZ', '100')), type=float), 1), MAX_HZ)
+        if not _profile_lock.acquire(blocking=False):
+            return jsonify({'ok': False, 'error': 'A profile is already running'}), 409
+        try:
+            counts, samples = sample(seconds, hz)
+        finally:
+            _profile_lock.release()
+
+        collapsed = '\n'.join(f'{stack} {n}' for stack, n in counts.most_common())
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'ok': True,
+                'seconds': seconds,
+                'hz': hz,
+                'samples': samples,
+                'collapsed': collapsed,
+                'threads': thread_dump(),
+            })
+        return Response(collapsed + '\n', mimetype='text/plain')
+
+    @app.get('/v1/debug/threads')
+    def debug_threads():
+        if not _authorized():
+            return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+        return jsonify({'ok': True, 'threads': thread_dump()})
@@ -0,0 +1,222 @@
+"""
+Telemetría offline-first de los agentes del kiosko.
+
+`emit()` solo añade el evento a un buffer en memoria, así que no cuesta
+nada en el camino caliente. Un hilo de fondo vuelca el buffer a un spool
+local en disco (segmentos JSONL) y sube los segmentos cerrados en lotes
+comprimidos con gzip al colector HTTP configurado, con reintentos y
+back-off exponencial. Si la red no está disponible el spool crece hasta
+`TELEMETRY_SPOOL_MAX_BYTES` y después se descartan los segmentos más
+antiguos. Un segmento que el colector rechaza de forma permanente (4xx
+salvo 408/429) se aparta como `.rejected` para no bloquear los siguientes.
+
+Variables de entorno:
+- `TELEMETRY_URL`: colector (p.ej. http://collector:9200/v1/events)
+- `TELEMETRY_SPOOL_DIR`: directorio del spool (cada agente usa su subdirectorio)
+- `TELEMETRY_SPOOL_MAX_BYTES`: tamaño máximo del spool (por defecto 5 MB)
+- `TELEMETRY_BATCH_SECONDS`: antigüedad máxima de un lote antes de subirlo (por defecto 30)
+- `TELEMETRY_KIOSK_ID`: identificador del kiosko (por defecto el hostname)
+
+Sin `TELEMETRY_URL` ni `TELEMETRY_SPOOL_DIR` la telemetría está
+desactivada. Módulo compartido por printer-agent y qr-scanner-agent: se
+copia junto a cada server.py al instalar (ver debian/rules e install.sh).
+"""
+
+import collections
+import gzip
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_BYTES = 256 * 1024
+FLUSH_INTERVAL = 2.0
+MAX_BACKOFF = 300.0
+MAX_REJECTED = 5
+# 4xx que sí merece la pena reintentar
+RETRYABLE_4XX = (408, 429)
+
+
+class Telemetry:
+    def __init__(self, agent, spool_dir=None, url=None, kiosk_id=None,
+                 max_spool_bytes=5 * 1024 * 1024, batch_seconds=30.0, buffer_size=10000):
+        self.agent = agent
+        self.url = url
+        # Subdirectorio por agente: el mismo TELEMETRY_SPOOL_DIR puede darse a
+        # ambos servicios sin que uno cierre o suba los segmentos del otro
+        self.spool_dir = os.path.join(spool_dir, agent) if spool_dir else None
+        self.kiosk_id = kiosk_id or socket.gethostname()
+        self.max_spool_bytes = max_spool_bytes
+        self.batch_seconds = batch_seconds
+        self.enabled = bool(spool_dir)
+        # deque con maxlen: si el hilo de fondo se atasca se pierden los más antiguos
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._segment = None
+        self._segment_opened_at = 0.0
+        self._backoff = 0.0
+        self._next_upload = 0.0
+        self._thread = None
+        self._counters_lock = threading.Lock()
+        self.counters = collections.Counter()
+        if self.enabled:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # Segmentos abiertos de una ejecución anterior: se cierran para subirlos
+            for name in os.listdir(self.spool_dir):
+                if name.endswith('.open'):
+                    path = os.path.join(self.spool_dir, name)
+                    os.replace(path, path[:-len('.open')] + '.jsonl')
+
+    def emit(self, event_type, **fields):
+        """Registra un evento (no bloquea ni hace E/S)."""
+        if not self.enabled:
+            return
+        self._buffer.append({'ts': time.time(), 'type': event_type, **fields})
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+            self._thread.start()
+        return self
+
+    def _count(self, name, n=1):
+        with self._counters_lock:
+            self.counters[name] += n
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self._flush_to_spool()
+                now = time.monotonic()
+                if self._segment and now - self._segment_opened_at >= self.batch_seconds:
+                    self._rotate()
+                if self.url and now >= self._next_upload:
+                    self._upload_pending()
+                self._enforce_cap()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f'Telemetry error: {e}')
+
+    # --- spool ---------------------------------------------------------
+
+    def _segments(self):
+        """Segmentos cerrados, del más antiguo al más nuevo."""
+        names = sorted(n for n in os.listdir(self.spool_dir) if n.endswith('.jsonl'))
+        return [os.path.join(self.spool_dir, n) for n in names]
+
+    def _flush_to_spool(self):
+        if not self._buffer:
+            return
+        lines = []
+        while self._buffer:
+            event = self._buffer.popleft()
+            event.setdefault('agent', self.agent)
+            event.setdefault('kiosk', self.kiosk_id)
+            lines.append(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+        if self._segment is None:
+            self._segment = os.path.join(self.spool_dir, f'{time.time_ns()}.open')
+            self._segment_opened_at = time.monotonic()
+        with open(self._segment, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        self._count('spooled', len(lines))
+        if os.path.getsize(self._segment) >= SEGMENT_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        """Cierra el segmento actual para que pueda subirse."""
+        if self._segment and os.path.exists(self._segment):
+            os.replace(self._segment, self._segment[:-len('.open')] + '.jsonl')
+        self._segment = None
+
+    def _enforce_cap(self):
+        segments = self._segments()
+        sizes = {s: os.path.getsize(s) for s in segments}
+        total = sum(sizes.values())
+        while segments and total > self.max_spool_bytes:
+            oldest = segments.pop(0)
+            total -= sizes[oldest]
+            os.remove(oldest)
+            self._count('dropped_segments')
+            logger.warning(f'Telemetry spool over {self.max_spool_bytes} bytes, dropped {oldest}')
+
+    # --- subida --------------------------------------------------------
+
+    def _upload_pending(self):
+        for segment in self._segments():
+            with open(segment, 'rb') as f:
+                body = gzip.compress(f.read())
+            req = urllib.request.Request(self.url, data=body, method='POST', headers={
+                'Content-Type': 'application/x-ndjson',
+                'Content-Encoding': 'gzip',
+                'X-Agent': self.agent,
+                'X-Kiosk-Id': self.kiosk_id,
+            })
+            try:
+                with urllib.request.urlopen(req, timeout=10) as resp:
+                    resp.read()
+            except urllib.error.HTTPError as e:
+                if 400 <= e.code < 500 and e.code not in RETRYABLE_4XX:
+                    # Rechazo permanente: reintentarlo bloquearía el resto del spool
+                    self._reject(segment)
+                    self._count('rejected_segments')
+                    logger.error(f'Telemetry collector rejected {segment} ({e.code}), set aside')
+                    continue
+                self._retry_later(e)
+                return
+            except (OSError, http.client.HTTPException) as e:
+                # HTTPException (respuesta cortada o inválida) no es OSError
+                self._retry_later(e)
+                return
+            os.remove(segment)
+            self._backoff = 0.0
+            self._count('uploaded_batches')
+            self._count('uploaded_bytes', len(body))
+
+    def _retry_later(self, error):
+        # Back-off exponencial con jitter; el segmento queda en el spool
+        self._backoff = min(MAX_BACKOFF, max(FLUSH_INTERVAL, self._backoff * 2))
+        self._next_upload = time.monotonic() + self._backoff * random.uniform(0.5, 1.0)
+        self._count('upload_errors')
+        logger.warning(f'Telemetry upload failed ({error}), retrying in ~{self._backoff:.0f}s')
+
+    def _reject(self, segment):
+        """Aparta el segmento para inspección; solo se guardan los MAX_REJECTED últimos."""
+        os.replace(segment, segment[:-len('.jsonl')] + '.rejected')
+        rejected = sorted(n for n in os.listdir(self.spool_dir) if n.endswith('.rejected'))
+        for name in rejected[:-MAX_REJECTED]:
+            os.remove(os.path.join(self.spool_dir, name))
+
+    def stats(self):
+        if not self.enabled:
+            return {'enabled': False}
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            'enabled': True,
+            'url': self.url,
+            'buffered': len(self._buffer),
+            'pending_segments': len(self._segments()),
+            'backoff_s': round(self._backoff, 1),
+            **counters,
+        }
+
+
+def from_env(agent, base_dir):
+    """Telemetría configurada por entorno; el spool por defecto va en `base_dir`."""
+    url = os.environ.get('TELEMETRY_URL')
+    spool_dir = os.environ.get('TELEMETRY_SPOOL_DIR') or (os.path.join(base_dir, '.telemetry-spool') if url else None)
+    return Telemetry(
+        agent,
+        spool_dir=spool_dir,
+        url=url,
+        kiosk_id=os.environ.get('TELEMETRY_KIOSK_ID'),
+        max_spool_bytes=int(os.environ.get('TELEMETRY_SPOOL_MAX_BYTES', str(5 * 1024 * 1024))),
+        batch_seconds=float(os.environ.get('TELEMETRY_BATCH_SECONDS', '30')),
+    ).start()
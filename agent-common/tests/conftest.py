@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Módulos compartidos y el colector de prueba de loadtest/
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_here, '..'))
+sys.path.insert(0, os.path.join(_here, '..', '..', 'loadtest'))
@@ -0,0 +1,141 @@
+import os
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import telemetry
+from telemetry_collector import Collector, make_handler
+
+
+@pytest.fixture
+def collector():
+    """Colector de loadtest/ en un puerto libre; `fail_rate=1` rechaza con 503."""
+    servers = []
+
+    def start(fail_rate=0.0):
+        c = Collector(fail_rate=fail_rate)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(c))
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return c, f'http://127.0.0.1:{server.server_port}/v1/events'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _spool(t, *batches):
+    """Escribe cada lote de eventos como un segmento cerrado."""
+    for batch in batches:
+        for i in range(batch):
+            t.emit('scan', i=i)
+        t._flush_to_spool()
+        t._rotate()
+        time.sleep(0.001)  # nombres de segmento distintos (time_ns)
+
+
+def test_uploads_and_clears_spool(tmp_path, collector):
+    c, url = collector()
+    t = telemetry.Telemetry('qr-scanner-agent', spool_dir=str(tmp_path), url=url, kiosk_id='kiosk-1')
+    _spool(t, 3, 2)
+
+    t._upload_pending()
+
+    assert c.summary()['batches'] == 2
+    assert c.summary()['events'] == {'qr-scanner-agent/scan': 5}
+    assert t._segments() == []
+    stats = t.stats()
+    assert stats['uploaded_batches'] == 2 and stats['spooled'] == 5
+
+
+def test_server_error_keeps_segment_and_backs_off(tmp_path, collector):
+    c, url = collector(fail_rate=1.0)
+    t = telemetry.Telemetry('printer-agent', spool_dir=str(tmp_path), url=url)
+    _spool(t, 1, 1)
+
+    t._upload_pending()
+    first = t._backoff
+    assert len(t._segments()) == 2
+    assert first == telemetry.FLUSH_INTERVAL
+    assert t._next_upload > time.monotonic()
+    # Solo se intenta el primer segmento por ronda
+    assert c.summary()['rejected'] == 1
+
+    t._upload_pending()
+    assert t._backoff == 2 * first
+    assert t.stats()['upload_errors'] == 2
+
+    c.fail_rate = 0.0
+    t._upload_pending()
+    assert t._segments() == [] and t._backoff == 0.0
+
+
+def test_permanent_rejection_sets_segment_aside(tmp_path, collector):
+    c, url = collector()
+    t = telemetry.Telemetry('printer-agent', spool_dir=str(tmp_path), url=url)
+    _spool(t, 1, 1)
+    # El colector responde 400 a un cuerpo que no puede descomprimir
+    bad = t._segments()[0]
+    with open(bad, 'wb') as f:
+        f.write(b'\xff\xfe not json')
+
+    t._upload_pending()
+
+    assert c.summary()['batches'] == 1
+    assert t._segments() == []
+    assert os.listdir(t.spool_dir) == [os.path.basename(bad)[:-len('.jsonl')] + '.rejected']
+    assert t.stats()['rejected_segments'] == 1
+    assert t._backoff == 0.0
+
+
+def test_invalid_http_response_backs_off(tmp_path):
+    # Servidor que responde algo que no es HTTP: http.client lanza
+    # BadStatusLine, que no es OSError
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+
+    def serve():
+        conn, _ = server.accept()
+        conn.recv(65536)
+        conn.sendall(b'garbage\r\n\r\n')
+        conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    t = telemetry.Telemetry('printer-agent', spool_dir=str(tmp_path),
+                            url=f'http://127.0.0.1:{server.getsockname()[1]}/v1/events')
+    _spool(t, 1)
+
+    t._upload_pending()
+    server.close()
+
+    assert len(t._segments()) == 1
+    assert t._backoff > 0 and t.stats()['upload_errors'] == 1
+
+
+def test_cap_drops_oldest_segments(tmp_path):
+    t = telemetry.Telemetry('printer-agent', spool_dir=str(tmp_path), max_spool_bytes=1)
+    _spool(t, 1, 1, 1)
+    newest = t._segments()[-1]
+    t.max_spool_bytes = os.path.getsize(newest)
+
+    t._enforce_cap()
+
+    assert t._segments() == [newest]
+    assert t.stats()['dropped_segments'] == 2
+
+
+def test_agents_sharing_spool_dir_use_own_subdirectory(tmp_path):
+    printer = telemetry.Telemetry('printer-agent', spool_dir=str(tmp_path))
+    printer.emit('print_job')
+    printer._flush_to_spool()  # segmento .open del printer-agent
+
+    scanner = telemetry.Telemetry('qr-scanner-agent', spool_dir=str(tmp_path))
+
+    assert printer.spool_dir != scanner.spool_dir
+    assert os.path.exists(printer._segment)  # no lo cerró el otro agente
+    assert scanner._segments() == []
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Hardware simulado para pruebas de carga
+- FakeEscPosSink: impresora ESC/POS de red (TCP 9100) que descarta los datos
+- SyntheticScanner: fuente de escaneos que envía códigos por UDP al
+  qr-scanner-agent (QR_SCANNER_SIMULATED_UDP_PORT)
+"""
+
+import random
+import socket
+import socketserver
+import threading
+import time
+
+
+class FakeEscPosSink:
+    """Sumidero TCP que acepta trabajos ESC/POS y cuenta bytes y conexiones"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100, bytes_per_s: float = 0):
+        self.bytes_per_s = bytes_per_s
+        self.jobs = 0
+        self.bytes_received = 0
+        self.cuts = 0
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with sink._lock:
+                    sink.jobs += 1
+                while True:
+                    data = self.request.recv(4096)
+                    if not data:
+                        break
+                    with sink._lock:
+                        sink.bytes_received += len(data)
+                        # GS V: corte de papel = fin de ticket
+                        sink.cuts += data.count(b"\x1dV")
+                    if sink.bytes_per_s:
+                        # Simula la velocidad de impresión de la impresora
+                        time.sleep(len(data) / sink.bytes_per_s)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "port": self.port,
+                "connections": self.jobs,
+                "tickets_cut": self.cuts,
+                "bytes_received": self.bytes_received,
+            }
+
+
+class SyntheticScanner:
+    """Genera escaneos de descuento a un ritmo fijo (Poisson)"""
+
+    def __init__(self, port: int, rate: float = 1.0, invalid_ratio: float = 0.05):
+        self.port = port
+        self.rate = rate
+        self.invalid_ratio = invalid_ratio
+        self.sent = 0
+        self._running = False
+        self._thread = None
+
+    def _code(self) -> str:
+        if random.random() < self.invalid_ratio:
+            return "INVALID"
+        return f"-{random.randint(1, 999) / 100:.2f}"
+
+    def send(self, code: str):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(code.encode(), ("127.0.0.1", self.port))
+        self.sent += 1
+
+    def _run(self):
+        while self._running:
+            time.sleep(random.expovariate(self.rate))
+            if self._running:
+                self.send(self._code())
+
+    def start(self):
+        if self.rate <= 0:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+
+
+if __name__ == "__main__":
+    sink = FakeEscPosSink().start()
+    print(f"Impresora ESC/POS simulada escuchando en 127.0.0.1:{sink.port} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(5)
+            print(sink.stats())
+    except KeyboardInterrupt:
+        sink.stop()
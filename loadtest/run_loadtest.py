@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para printer-agent y qr-scanner-agent
+Arranca ambos agentes contra hardware simulado, lanza una mezcla
+configurable de peticiones y escribe un informe JSON comparable entre
+ejecuciones (throughput, latencias p50/p99, errores, RSS/CPU de los agentes)
+
+Ejemplo:
+    python3 run_loadtest.py --duration 30 --concurrency 8 \\
+        --mix print-ticket=1,scan=1,status=10,current-discount=10 \\
+        --output result.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from fake_hardware import FakeEscPosSink, SyntheticScanner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+TICKET = {
+    "title": "Ticket de Estacionamiento",
+    "lines": [
+        "Matrícula: ABC1234",
+        "Zona: Azul",
+        "Inicio: 2024-01-15T10:00:00",
+        "Fin: 2024-01-15T12:00:00",
+        "Precio: 2.50 €",
+        "Método: Tarjeta",
+    ],
+    "qrData": json.dumps({"plate": "ABC1234", "zone": "Azul", "price": 2.50}),
+}
+
+# nombre -> (agente, método, ruta, cuerpo)
+REQUESTS = {
+    "print-ticket": ("printer", "POST", "/v1/print-ticket", TICKET),
+    "scan": ("scanner", "POST", "/v1/scan", {"timeout": 5}),
+    "status": ("scanner", "GET", "/v1/status", None),
+    "current-discount": ("scanner", "GET", "/v1/current-discount", None),
+}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in REQUESTS:
+            raise argparse.ArgumentTypeError(f"Petición desconocida: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 2)
+
+
+class ProcessSampler:
+    """Muestrea RSS y tiempo de CPU de un proceso desde /proc"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.rss_samples = []
+        self.cpu_start = self._cpu_seconds()
+        self.wall_start = time.monotonic()
+
+    def _cpu_seconds(self) -> float:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / CLK_TCK
+        except (OSError, IndexError):
+            return 0.0
+
+    def sample(self):
+        try:
+            with open(f"/proc/{self.pid}/statm") as f:
+                self.rss_samples.append(int(f.read().split()[1]) * PAGE_SIZE)
+        except OSError:
+            pass
+
+    def report(self) -> dict:
+        wall = max(time.monotonic() - self.wall_start, 1e-6)
+        cpu = self._cpu_seconds() - self.cpu_start
+        mb = [r / 1024 / 1024 for r in self.rss_samples]
+        return {
+            "rss_mb_max": round(max(mb), 1) if mb else None,
+            "rss_mb_avg": round(sum(mb) / len(mb), 1) if mb else None,
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent": round(100 * cpu / wall, 1),
+        }
+
+
+def start_agent(name: str, script_dir: str, env: dict, python: str) -> subprocess.Popen:
+    log = open(os.path.join(os.environ.get("TMPDIR", "/tmp"), f"loadtest-{name}.log"), "w")
+    return subprocess.Popen(
+        [python, "server.py"],
+        cwd=os.path.join(ROOT, script_dir),
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_healthy(port: int, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/v1/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El agente en el puerto {port} no respondió a /v1/health")
+
+
+def get_json(port: int, path: str):
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        return {"ok": False, "error": str(e)}
+
+
+class Worker(threading.Thread):
+    def __init__(self, index: int, ports: dict, mix: dict, deadline: float, results: dict,
+                 lock: threading.Lock):
+        super().__init__(daemon=True)
+        # Cada worker simula un kiosko distinto para la cola compartida de impresión
+        self.kiosk_id = f"kiosk-{index}"
+        self.ports = ports
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.deadline = deadline
+        self.results = results
+        self.lock = lock
+        self.conns = {}
+
+    def _conn(self, agent: str) -> http.client.HTTPConnection:
+        if agent not in self.conns:
+            self.conns[agent] = http.client.HTTPConnection("127.0.0.1", self.ports[agent], timeout=30)
+        return self.conns[agent]
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            name = random.choices(self.names, self.weights)[0]
+            agent, method, path, body = REQUESTS[name]
+            payload = json.dumps(body).encode() if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload else {}
+            if agent == "printer":
+                headers["X-Kiosk-Id"] = self.kiosk_id
+            start = time.monotonic()
+            ok = False
+            try:
+                conn = self._conn(agent)
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status < 400
+            except (OSError, http.client.HTTPException):
+                self.conns.pop(agent, None)
+            elapsed_ms = (time.monotonic() - start) * 1000
+            with self.lock:
+                entry = self.results[name]
+                entry["latencies"].append(elapsed_ms)
+                if not ok:
+                    entry["errors"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los agentes del kiosko")
+    parser.add_argument("--duration", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=4, help="clientes concurrentes")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("print-ticket=1,scan=1,status=10,current-discount=10"),
+                        help="pesos por petición, p.ej. print-ticket=1,status=10")
+    parser.add_argument("--scan-rate", type=float, default=2.0, help="escaneos simulados por segundo")
+    parser.add_argument("--sink-port", type=int, default=9100, help="puerto de la impresora simulada")
+    parser.add_argument("--sink-bytes-per-s", type=float, default=0,
+                        help="velocidad simulada de la impresora (0 = sin límite)")
+    parser.add_argument("--printer-port", type=int, default=19101)
+    parser.add_argument("--scanner-port", type=int, default=19102)
+    parser.add_argument("--scanner-udp-port", type=int, default=19103)
+    parser.add_argument("--python", default=sys.executable,
+                        help="intérprete con las dependencias de los agentes")
+    parser.add_argument("--output", help="fichero JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    sink = FakeEscPosSink(port=args.sink_port, bytes_per_s=args.sink_bytes_per_s).start()
+    agents = {
+        "printer": start_agent("printer", "printer-agent", {
+            "PRINTER_PORT": str(args.printer_port),
+            "ESC_POS_BACKEND": "network",
+            "ESC_POS_NETWORK_HOST": "127.0.0.1",
+            "ESC_POS_NETWORK_PORT": str(sink.port),
+        }, args.python),
+        "scanner": start_agent("scanner", "qr-scanner-agent", {
+            "QR_SCANNER_PORT": str(args.scanner_port),
+            "QR_SCANNER_SIMULATED_UDP_PORT": str(args.scanner_udp_port),
+        }, args.python),
+    }
+    ports = {"printer": args.printer_port, "scanner": args.scanner_port}
+    scanner = SyntheticScanner(args.scanner_udp_port, rate=args.scan_rate)
+
+    try:
+        for port in ports.values():
+            wait_healthy(port)
+        samplers = {name: ProcessSampler(proc.pid) for name, proc in agents.items()}
+        scanner.start()
+
+        results = {name: {"latencies": [], "errors": 0} for name in args.mix}
+        lock = threading.Lock()
+        started = time.monotonic()
+        deadline = started + args.duration
+        workers = [Worker(i, ports, args.mix, deadline, results, lock) for i in range(args.concurrency)]
+        for w in workers:
+            w.start()
+        while any(w.is_alive() for w in workers):
+            for sampler in samplers.values():
+                sampler.sample()
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+        scanner.stop()
+        # Reparto de la impresora entre kioskos (trabajos y esperas por cliente)
+        print_queue = get_json(args.printer_port, "/v1/queue").get("clients")
+
+        report = {
+            "config": {
+                "duration_s": args.duration,
+                "concurrency": args.concurrency,
+                "mix": args.mix,
+                "scan_rate": args.scan_rate,
+                "sink_bytes_per_s": args.sink_bytes_per_s,
+            },
+            "elapsed_s": round(elapsed, 2),
+            "requests": {},
+            "agents": {name: s.report() for name, s in samplers.items()},
+            "printer_sink": sink.stats(),
+            "print_queue": print_queue,
+            "synthetic_scans_sent": scanner.sent,
+        }
+        total = 0
+        for name, entry in results.items():
+            lat = entry["latencies"]
+            total += len(lat)
+            report["requests"][name] = {
+                "count": len(lat),
+                "throughput_rps": round(len(lat) / elapsed, 2),
+                "p50_ms": percentile(lat, 50),
+                "p99_ms": percentile(lat, 99),
+                "error_rate": round(entry["errors"] / len(lat), 4) if lat else 0.0,
+            }
+        report["throughput_rps"] = round(total / elapsed, 2)
+    finally:
+        scanner.stop()
+        for proc in agents.values():
+            proc.terminate()
+        for proc in agents.values():
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        sink.stop()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Colector de telemetría local para pruebas
+Recibe los lotes gzip+NDJSON que envían los agentes (TELEMETRY_URL),
+los añade a un fichero JSONL y muestra un resumen por tipo de evento.
+Con --fail-rate se rechaza una fracción de lotes para probar reintentos.
+
+Ejemplo:
+    python3 telemetry_collector.py --port 9200 --output eventos.jsonl
+    TELEMETRY_URL=http://127.0.0.1:9200/v1/events python3 ../printer-agent/server.py
+"""
+
+import argparse
+import collections
+import gzip
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Collector:
+    def __init__(self, output=None, fail_rate=0.0):
+        self.output = output
+        self.fail_rate = fail_rate
+        self.batches = 0
+        self.rejected = 0
+        self.events = collections.Counter()
+        self._lock = threading.Lock()
+
+    def ingest(self, body: bytes, encoding: str) -> int:
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        lines = [line for line in body.decode("utf-8").splitlines() if line.strip()]
+        events = [json.loads(line) for line in lines]
+        with self._lock:
+            self.batches += 1
+            for event in events:
+                self.events[(event.get("agent"), event.get("type"))] += 1
+            if self.output:
+                with open(self.output, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+        return len(events)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rejected": self.rejected,
+                "events": {f"{agent}/{etype}": n for (agent, etype), n in sorted(self.events.items())},
+            }
+
+
+def make_handler(collector: Collector):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != "/v1/events":
+                return self._reply(404, {"ok": False})
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if random.random() < collector.fail_rate:
+                with collector._lock:
+                    collector.rejected += 1
+                return self._reply(503, {"ok": False, "error": "simulated failure"})
+            try:
+                count = collector.ingest(body, self.headers.get("Content-Encoding", ""))
+            except (OSError, ValueError) as e:
+                return self._reply(400, {"ok": False, "error": str(e)})
+            print(f"Lote de {self.headers.get('X-Agent')}@{self.headers.get('X-Kiosk-Id')}: "
+                  f"{count} eventos ({len(body)} bytes)")
+            self._reply(200, {"ok": True, "received": count})
+
+        def do_GET(self):
+            if self.path == "/v1/summary":
+                return self._reply(200, collector.summary())
+            self._reply(404, {"ok": False})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Colector de telemetría de prueba")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--output", help="fichero JSONL donde guardar los eventos")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fracción de lotes rechazados con 503 (prueba de reintentos)")
+    args = parser.parse_args()
+
+    collector = Collector(args.output, args.fail_rate)
+    server = ThreadingHTTPServer((args.bind, args.port), make_handler(collector))
+    print(f"Colector escuchando en http://{args.bind}:{args.port}/v1/events "
+          f"(resumen en /v1/summary)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(collector.summary(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
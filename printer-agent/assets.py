@@ -0,0 +1,174 @@
+"""
+Caché de imágenes (logos) pre-rasterizadas para las cabeceras de ticket.
+
+Cada asset se registra una vez por nombre (API o directorio de
+configuración), se redimensiona al ancho del papel, se difumina y se
+codifica a bytes raster nativos. El resultado se guarda en memoria y en
+disco indexado por el hash del contenido, así que imprimir un logo por
+nombre no cuesta más que enviar sus bytes. También se guarda la imagen
+original, de modo que si cambia el ancho de papel o el modo raster el
+asset se vuelve a rasterizar la primera vez que se usa.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+
+from PIL import Image
+
+import raster
+
+logger = logging.getLogger(__name__)
+
+# Puntos imprimibles por ancho de papel (203 dpi)
+PAPER_DOTS = {58: 384, 80: 576}
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+def paper_dots():
+    mm = int(os.environ.get('ESC_POS_PAPER_MM', '58'))
+    return PAPER_DOTS.get(mm, PAPER_DOTS[58])
+
+
+class AssetCache:
+    def __init__(self, cache_dir, asset_dir=None):
+        self.cache_dir = cache_dir
+        self.asset_dir = asset_dir
+        self._lock = threading.Lock()
+        self._names = {}     # nombre -> hash del contenido original
+        self._payloads = {}  # clave (hash-ancho-modo) -> (modo, bytes)
+        os.makedirs(self._source_dir(), exist_ok=True)
+        self._load_index()
+        if self.asset_dir and os.path.isdir(self.asset_dir):
+            self.load_dir(self.asset_dir)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _source_dir(self):
+        return os.path.join(self.cache_dir, 'src')
+
+    def _source_path(self, digest):
+        return os.path.join(self._source_dir(), digest)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                names = json.load(f)
+        except (OSError, ValueError):
+            names = {}
+        # Solo se conservan los assets cuya imagen original está guardada
+        # (necesaria para volver a rasterizar si cambia el papel o el modo)
+        self._names = {
+            name: digest for name, digest in names.items()
+            if os.path.exists(self._source_path(digest))
+        }
+
+    def _save_index(self):
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._names, f)
+        os.replace(tmp, self._index_path())
+
+    @staticmethod
+    def _key(digest):
+        """Clave del raster para la configuración actual de papel y modo."""
+        return f'{digest}-{paper_dots()}-{raster.raster_mode()}'
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.bin')
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _render(self, content):
+        img = Image.open(io.BytesIO(content))
+        img.load()
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Transparencia -> fondo blanco (papel)
+            rgba = img.convert('RGBA')
+            img = Image.new('RGBA', rgba.size, 'white')
+            img.alpha_composite(rgba)
+        dots = paper_dots()
+        if img.width > dots:
+            height = max(1, round(img.height * dots / img.width))
+            img = img.resize((dots, height), Image.LANCZOS)
+        return raster.encode_image(img, raster.raster_mode(), dither=True)
+
+    def _raster(self, digest):
+        """Raster del asset para la configuración actual (memoria -> disco -> render)."""
+        key = self._key(digest)
+        with self._lock:
+            entry = self._payloads.get(key)
+        if entry is not None:
+            return entry
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                mode, _, payload = f.read().partition(b'\n')
+            entry = (mode.decode(), payload)
+        else:
+            source = self._source_path(digest)
+            if not os.path.exists(source):
+                return None
+            with open(source, 'rb') as f:
+                entry = self._render(f.read())
+            self._write_atomic(path, entry[0].encode() + b'\n' + entry[1])
+        with self._lock:
+            self._payloads[key] = entry
+        return entry
+
+    def register(self, name, content):
+        """Registra `content` (bytes de imagen) como asset `name`."""
+        digest = hashlib.sha256(content).hexdigest()
+        key = self._key(digest)
+        if not os.path.exists(self._disk_path(key)):
+            # Se rasteriza antes de guardar nada: una imagen inválida lanza
+            # aquí y no deja ficheros huérfanos en la caché
+            entry = self._render(content)
+            self._write_atomic(self._disk_path(key), entry[0].encode() + b'\n' + entry[1])
+        if not os.path.exists(self._source_path(digest)):
+            self._write_atomic(self._source_path(digest), content)
+        self._raster(digest)
+        with self._lock:
+            self._names[name] = digest
+            self._save_index()
+        return self.describe(name)
+
+    def load_dir(self, asset_dir):
+        """Registra cada imagen del directorio con su nombre sin extensión."""
+        for fname in sorted(os.listdir(asset_dir)):
+            base, ext = os.path.splitext(fname)
+            if ext.lower() not in IMAGE_SUFFIXES:
+                continue
+            path = os.path.join(asset_dir, fname)
+            # Un fichero dañado no debe impedir que arranque el agente
+            try:
+                with open(path, 'rb') as f:
+                    self.register(base, f.read())
+            except Exception as e:  # noqa: BLE001
+                logger.error(f'Skipping asset {path}: {e}')
+
+    def get(self, name):
+        """Devuelve (modo, bytes) del asset o None si no existe."""
+        with self._lock:
+            digest = self._names.get(name)
+        return self._raster(digest) if digest else None
+
+    def describe(self, name):
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return {'name': name, 'key': self._key(self._names[name]), 'mode': entry[0], 'bytes': len(entry[1])}
+
+    def list(self):
+        with self._lock:
+            names = sorted(self._names)
+        return [d for d in (self.describe(n) for n in names) if d]
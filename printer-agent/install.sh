@@ -18,6 +18,8 @@ usermod -aG dialout "$USER_NAME" || true
 id -u "$USER_NAME" >/dev/null 2>&1 || useradd -m -s /bin/bash "$USER_NAME"
 mkdir -p "$DEST_DIR"
 rsync -a --delete ./ "$DEST_DIR"/
+# Módulos compartidos con qr-scanner-agent
+install -m 0644 ../agent-common/*.py "$DEST_DIR"/
 chown -R "$USER_NAME":"$USER_NAME" "$DEST_DIR"
 
 sudo -u "$USER_NAME" bash -c "cd '$DEST_DIR' && python3 -m venv .venv && . .venv/bin/activate && pip install -r requirements.txt"
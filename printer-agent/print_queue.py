@@ -0,0 +1,246 @@
+"""
+Cola de impresión compartida con reparto justo entre kioskos.
+
+Un único hilo es dueño de la conexión con la impresora y la reutiliza entre
+trabajos; si falla sobre una conexión reutilizada, se reabre y el trabajo se
+reintenta una vez. Los trabajos se encolan por cliente (kiosko) y se atienden en
+round-robin ponderado, con un límite de cola por cliente, de forma que un
+kiosko muy activo no deja sin servicio a los demás. Se guardan tiempos de
+espera por cliente; los clientes inactivos sin peso configurado se olvidan.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PrintJob:
+    def __init__(self, job_id, client, data):
+        self.id = job_id
+        self.client = client
+        self.data = data
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.cancelled = False
+        self.retried = False
+        self.done = threading.Event()
+
+    @property
+    def wait_ms(self):
+        if self.started_at is None:
+            return None
+        return round((self.started_at - self.enqueued_at) * 1000, 1)
+
+
+class ClientStats:
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.retried = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.last_wait_ms = None
+
+    def observe(self, job):
+        wait = job.wait_ms or 0.0
+        self.wait_total_ms += wait
+        self.wait_max_ms = max(self.wait_max_ms, wait)
+        self.last_wait_ms = wait
+        if job.retried:
+            self.retried += 1
+        if job.error:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def to_dict(self, queued):
+        served = self.completed + self.failed
+        return {
+            'queued': queued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+            'retried': self.retried,
+            'wait_ms_avg': round(self.wait_total_ms / served, 1) if served else None,
+            'wait_ms_max': round(self.wait_max_ms, 1),
+            'wait_ms_last': self.last_wait_ms,
+        }
+
+
+def parse_weights(text):
+    """'kiosk-1=2,kiosk-2=1' -> {'kiosk-1': 2, 'kiosk-2': 1}"""
+    weights = {}
+    for part in (text or '').split(','):
+        name, _, weight = part.partition('=')
+        if name.strip():
+            weights[name.strip()] = max(1, int(weight or 1))
+    return weights
+
+
+class FairPrintQueue:
+    def __init__(self, open_printer, print_job, weights=None, per_client_limit=10, on_job_done=None,
+                 client_idle_s=600):
+        self._open_printer = open_printer
+        self._print_job = print_job
+        self._on_job_done = on_job_done
+        self.weights = weights or {}
+        self.per_client_limit = per_client_limit
+        self.client_idle_s = client_idle_s
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._order = []
+        self._rr_index = 0
+        self._credit = 0
+        self._stats = collections.defaultdict(ClientStats)
+        self._last_seen = {}
+        self._running = None
+        self._ids = itertools.count(1)
+        self._printer = None
+        self._thread = None
+
+    def _weight(self, client):
+        return self.weights.get(client, 1)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, client, data):
+        """Encola un trabajo; lanza QueueFull si el cliente supera su límite."""
+        with self._cond:
+            queue = self._queues.get(client)
+            if queue is None:
+                self._prune_idle()
+                queue = self._queues[client] = collections.deque()
+                self._order.append(client)
+            self._last_seen[client] = time.monotonic()
+            if len(queue) >= self.per_client_limit:
+                self._stats[client].rejected += 1
+                raise QueueFull(f'Queue full for client {client} ({self.per_client_limit} jobs)')
+            job = PrintJob(next(self._ids), client, data)
+            queue.append(job)
+            self._cond.notify()
+        return job
+
+    def cancel(self, job):
+        """Retira un trabajo que aún no ha empezado a imprimirse.
+
+        Devuelve True si el trabajo ya no se imprimirá y False si el hilo
+        de impresión ya lo tomó (terminará normalmente).
+        """
+        with self._cond:
+            if job.started_at is not None or job.cancelled:
+                return job.cancelled
+            self._queues[job.client].remove(job)
+            job.cancelled = True
+            self._stats[job.client].cancelled += 1
+        job.done.set()
+        return True
+
+    def _prune_idle(self):
+        """Olvida los clientes sin trabajos ni actividad en `client_idle_s`.
+
+        El identificador lo elige el cliente, así que sin esto las colas y
+        estadísticas crecerían con cada identificador distinto. Los clientes
+        con peso configurado se conservan siempre.
+        """
+        now = time.monotonic()
+        idle = [
+            client for client in self._order
+            if not self._queues[client] and client not in self.weights and client != self._running
+            and now - self._last_seen.get(client, now) >= self.client_idle_s
+        ]
+        if not idle:
+            return
+        current = self._order[self._rr_index]
+        for client in idle:
+            self._order.remove(client)
+            del self._queues[client]
+            self._stats.pop(client, None)
+            self._last_seen.pop(client, None)
+        if current in self._order:
+            self._rr_index = self._order.index(current)
+        else:
+            # Turno del cliente eliminado: _next_job pasa al siguiente
+            self._rr_index = min(self._rr_index, len(self._order) - 1) if self._order else 0
+            self._credit = 0
+
+    def _next_job(self):
+        """Round-robin ponderado: cada cliente atiende hasta `weight` trabajos por turno."""
+        n = len(self._order)
+        for _ in range(n + 1):
+            queue = self._queues[self._order[self._rr_index]]
+            if queue and self._credit > 0:
+                self._credit -= 1
+                return queue.popleft()
+            self._rr_index = (self._rr_index + 1) % n
+            self._credit = self._weight(self._order[self._rr_index])
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    job = self._next_job() if self._order else None
+                    if job is None:
+                        self._cond.wait()
+                # Bajo el lock: cancel() no puede retirar un trabajo ya tomado
+                job.started_at = time.monotonic()
+                self._running = job.client
+            for _ in range(2):
+                reused = self._printer is not None
+                try:
+                    if self._printer is None:
+                        self._printer = self._open_printer()
+                    self._print_job(self._printer, job.data)
+                    job.error = None
+                    break
+                except Exception as e:  # noqa: BLE001
+                    job.error = e
+                    self._close_printer()
+                    if not reused:
+                        break
+                    # La conexión reutilizada pudo caer por inactividad (NAT,
+                    # apagado de la impresora): se reabre y se reintenta una vez
+                    job.retried = True
+            job.finished_at = time.monotonic()
+            with self._cond:
+                self._stats[job.client].observe(job)
+                self._last_seen[job.client] = time.monotonic()
+                self._running = None
+                self._prune_idle()
+            job.done.set()
+            if self._on_job_done:
+                try:
+                    self._on_job_done(job)
+                except Exception:  # noqa: BLE001
+                    pass
+
+    def _close_printer(self):
+        # Connection is reopened on the next job
+        printer, self._printer = self._printer, None
+        try:
+            if printer is not None:
+                printer.close()
+        except Exception:  # noqa: BLE001
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                client: self._stats[client].to_dict(len(self._queues[client]))
+                for client in self._order
+            }
@@ -0,0 +1,201 @@
+"""
+Codificación raster ESC/POS con el menor tamaño en el cable.
+
+Convierte una imagen PIL a 1 bit, recorta márgenes y filas en blanco
+(que se sustituyen por avances de papel `ESC J`) y genera tanto
+`GS v 0` como el modo columna `ESC *` para quedarse con el más corto.
+La escritura se hace en bloques y, en puertos serie, se espera al final a
+que el puerto se vacíe para medir el caudal efectivo (bytes/s).
+"""
+
+import os
+import time
+
+from PIL import ImageOps
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+# Filas en blanco consecutivas a partir de las cuales compensa cortar el
+# bloque GS v 0 y avanzar papel con ESC J (cabecera 8 bytes + ESC J 3 bytes).
+MIN_BLANK_RUN = int(os.environ.get('ESC_POS_RASTER_MIN_BLANK_ROWS', '4'))
+CHUNK_SIZE = int(os.environ.get('ESC_POS_WRITE_CHUNK', '256'))
+
+# Estadísticas de la última transmisión raster (se reemplaza, no se modifica)
+last_transfer = {}
+
+
+def _to_bits(img, dither=False):
+    """Imagen -> modo '1' donde 1 = punto negro (convención ESC/POS).
+
+    Con `dither` se aplica Floyd-Steinberg (logos con grises); sin él se
+    umbraliza a 128, que es lo adecuado para QR.
+    """
+    gray = img.convert('L')
+    if dither:
+        return ImageOps.invert(gray).convert('1')
+    return gray.point(lambda v: 255 if v < 128 else 0, '1')
+
+
+def _feed(dots):
+    out = bytearray()
+    while dots > 0:
+        n = min(dots, 255)
+        out += ESC + b'J' + bytes([n])
+        dots -= n
+    return bytes(out)
+
+
+def _rows(bits):
+    """Devuelve (ancho en bytes, lista de filas empaquetadas MSB primero)."""
+    stride = (bits.width + 7) // 8
+    raw = bits.tobytes()
+    return stride, [raw[i:i + stride] for i in range(0, len(raw), stride)]
+
+
+def encode_gsv0(bits):
+    """Raster `GS v 0` partido en bloques alrededor de tramos en blanco."""
+    stride, rows = _rows(bits)
+    blank = bytes(stride)
+    out = bytearray()
+    block = []
+
+    def flush_block():
+        if block:
+            h = len(block)
+            out.extend(GS + b'v0\x00' + bytes([stride & 0xff, stride >> 8, h & 0xff, h >> 8]))
+            for r in block:
+                out.extend(r)
+            block.clear()
+
+    y = 0
+    while y < len(rows):
+        if rows[y] == blank:
+            run = y
+            while run < len(rows) and rows[run] == blank:
+                run += 1
+            if run - y >= MIN_BLANK_RUN:
+                flush_block()
+                out.extend(_feed(run - y))
+            else:
+                block.extend(rows[y:run])
+            y = run
+        else:
+            block.append(rows[y])
+            y += 1
+    flush_block()
+    return bytes(out)
+
+
+def encode_column(bits):
+    """Modo columna `ESC * 33` (24 puntos por banda, doble densidad)."""
+    w, h = bits.width, bits.height
+    px = bits.load()
+    out = bytearray(ESC + b'3' + bytes([24]))
+    pending_feed = 0
+    for top in range(0, h, 24):
+        rows = min(24, h - top)
+        band = bytearray(3 * w)
+        any_ink = False
+        for x in range(w):
+            for dy in range(rows):
+                if px[x, top + dy]:
+                    band[3 * x + dy // 8] |= 0x80 >> (dy % 8)
+                    any_ink = True
+        if not any_ink:
+            pending_feed += rows
+            continue
+        if pending_feed:
+            out += _feed(pending_feed)
+            pending_feed = 0
+        out += ESC + b'*' + bytes([33, w & 0xff, w >> 8]) + band
+        # La última banda puede ser parcial: ESC J avanza solo sus filas
+        # para que el papel avance lo mismo que con GS v 0
+        out += b'\n' if rows == 24 else _feed(rows)
+    out += ESC + b'2'
+    out += _feed(pending_feed)
+    return bytes(out)
+
+
+ENCODERS = {
+    'gsv0': encode_gsv0,
+    'column': encode_column,
+}
+
+
+def encode_image(img, mode='auto', dither=False):
+    """Codifica `img` y devuelve (modo, bytes) con el modo de menor tamaño.
+
+    Los márgenes laterales en blanco se recortan (la imagen se centra con
+    `ESC a 1`) y los superiores/inferiores se convierten en avances de
+    papel, de modo que el resultado impreso ocupa lo mismo.
+    """
+    bits = _to_bits(img, dither)
+    bbox = bits.getbbox()
+    if not bbox:
+        return 'feed', _feed(bits.height)
+    left, top, right, bottom = bbox
+    cropped = bits.crop((left, top, right, bottom))
+
+    if mode in ENCODERS:
+        candidates = {mode: ENCODERS[mode](cropped)}
+    else:
+        candidates = {name: enc(cropped) for name, enc in ENCODERS.items()}
+    chosen = min(candidates, key=lambda name: len(candidates[name]))
+
+    payload = (
+        ESC + b'a\x01'
+        + _feed(top)
+        + candidates[chosen]
+        + _feed(bits.height - bottom)
+        + ESC + b'a\x00'
+    )
+    return chosen, payload
+
+
+def write_chunked(p, data, chunk_size=CHUNK_SIZE):
+    """Envía `data` en bloques y devuelve los bytes/s medidos o None.
+
+    El control de flujo (RTS/CTS, XON/XOFF) lo aplica el driver serie, así
+    que los bloques se escriben seguidos y solo se espera una vez al final a
+    que el puerto se vacíe (`flush` = tcdrain). Solo en ese caso el tiempo
+    medido corresponde a la transmisión real; en USB y red `_raw` vuelve en
+    cuanto el kernel ha copiado los datos y no se informa caudal.
+    """
+    device = getattr(p, 'device', None)
+    drain = getattr(device, 'flush', None) if hasattr(device, 'baudrate') else None
+    start = time.monotonic()
+    for i in range(0, len(data), chunk_size):
+        p._raw(data[i:i + chunk_size])
+    if not drain:
+        return None
+    drain()
+    elapsed = max(time.monotonic() - start, 1e-6)
+    return len(data) / elapsed
+
+
+def raster_mode():
+    return os.environ.get('ESC_POS_RASTER_MODE', 'auto')
+
+
+def send_payload(p, chosen, payload):
+    """Envía un raster ya codificado y actualiza `last_transfer`."""
+    global last_transfer
+    bytes_per_s = write_chunked(p, payload)
+    # Se publica un dict nuevo: los lectores (p.ej. /v1/health) nunca ven
+    # uno a medio actualizar
+    last_transfer = {
+        'mode': chosen,
+        'bytes': len(payload),
+        'backend': type(p).__name__,
+        # Solo medido en puertos serie (vaciado con tcdrain)
+        'bytes_per_s': round(bytes_per_s, 1) if bytes_per_s is not None else None,
+        'timestamp': time.time(),
+    }
+    return dict(last_transfer)
+
+
+def print_image(p, img, mode=None):
+    """Imprime `img` con la codificación raster más compacta para `p`."""
+    chosen, payload = encode_image(img, mode or raster_mode())
+    return send_payload(p, chosen, payload)
@@ -1,12 +1,91 @@
 import os
 import io
+import hmac
+import sys
+import time
 from flask import Flask, request, jsonify
 from escpos.printer import Usb, Serial, Network
 import socket
 import qrcode
 
+# Shared modules: installed next to this file, or taken from the repo checkout
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agent-common'))
+import profiler
+import raster
+import telemetry
+import textenc
+from assets import AssetCache
+from print_queue import FairPrintQueue, QueueFull, parse_weights
+
 
 app = Flask(__name__)
+profiler.register(app)
+
+_here = os.path.dirname(os.path.abspath(__file__))
+asset_cache = AssetCache(
+    cache_dir=os.environ.get('ESC_POS_ASSET_CACHE_DIR', os.path.join(_here, '.asset-cache')),
+    asset_dir=os.environ.get('ESC_POS_ASSET_DIR', os.path.join(_here, 'assets')),
+)
+text_encoder = textenc.from_env()
+events = telemetry.from_env('printer-agent', _here)
+
+
+def _open_printer():
+    try:
+        p = _make_printer()
+    except Exception as e:  # noqa: BLE001
+        events.emit('hardware', device='printer', state='unavailable', error=str(e))
+        raise
+    events.emit('hardware', device='printer', state='connected', backend=type(p).__name__)
+    return p
+
+
+def _on_job_done(job):
+    duration_s = job.finished_at - job.started_at
+    # Raster stats only if an image was sent during this job
+    transfer = raster.last_transfer
+    if transfer.get('timestamp', 0) < time.time() - duration_s:
+        transfer = None
+    events.emit(
+        'print_job',
+        client=job.client,
+        job=job.id,
+        ok=job.error is None,
+        error=str(job.error) if job.error else None,
+        wait_ms=job.wait_ms,
+        duration_ms=round(duration_s * 1000, 1),
+        raster=transfer,
+    )
+    if job.error:
+        events.emit('hardware', device='printer', state='error', error=str(job.error))
+
+
+# Single owner of the printer connection, shared fairly across kiosks
+print_queue = FairPrintQueue(
+    open_printer=lambda: _open_printer(),
+    print_job=lambda p, data: _print_ticket(p, data),
+    weights=parse_weights(os.environ.get('PRINTER_CLIENT_WEIGHTS')),
+    per_client_limit=int(os.environ.get('PRINTER_CLIENT_QUEUE_LIMIT', '10')),
+    client_idle_s=float(os.environ.get('PRINTER_CLIENT_IDLE_SECONDS', '600')),
+    on_job_done=_on_job_done,
+).start()
+
+
+def _open_serial(devfile, baudrate):
+    # ESC_POS_SERIAL_FLOW: none | xonxoff | rtscts (needed above ~19200 baud)
+    flow = os.environ.get('ESC_POS_SERIAL_FLOW', 'none').lower()
+    p = Serial(
+        devfile=devfile,
+        baudrate=baudrate,
+        bytesize=8,
+        parity='N',
+        stopbits=1,
+        timeout=2,
+        xonxoff=flow == 'xonxoff',
+    )
+    if flow == 'rtscts':
+        p.device.rtscts = True
+    return p
 
 
 def _make_printer():
@@ -17,17 +96,19 @@ def _make_printer():
     net_scan_prefix = os.environ.get('ESC_POS_NETWORK_SCAN_PREFIX')  # e.g., 192.168.1.
     serial_dev = os.environ.get('ESC_POS_SERIAL_DEVICE')
     serial_baud = int(os.environ.get('ESC_POS_SERIAL_BAUD', '9600'))
+    backend = os.environ.get('ESC_POS_BACKEND', 'auto').lower()
+
+    # Forced backend skips autodetection (e.g. network printer, load tests)
+    if backend == 'network' and net_host:
+        return Network(net_host, port=net_port, timeout=3)
+    if backend == 'usb' and vid and pid:
+        return Usb(int(vid, 16), int(pid, 16), timeout=3)
+    if backend == 'serial' and serial_dev:
+        return _open_serial(serial_dev, serial_baud)
 
     # Priority for this project: serial → usb → network
     if serial_dev:
-        return Serial(
-            devfile=serial_dev,
-            baudrate=serial_baud,
-            bytesize=8,
-            parity='N',
-            stopbits=1,
-            timeout=2,
-        )
+        return _open_serial(serial_dev, serial_baud)
 
     # Try some common USB vendors if not specified
     common = [
@@ -48,14 +129,7 @@ def _make_printer():
         '/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyS0', '/dev/ttyS1',
     ]:
         try:
-            return Serial(
-                devfile=dev,
-                baudrate=serial_baud,
-                bytesize=8,
-                parity='N',
-                stopbits=1,
-                timeout=2,
-            )
+            return _open_serial(dev, serial_baud)
         except Exception as e:  # noqa: BLE001
             last_err = e
 
@@ -75,22 +149,23 @@ def _make_printer():
     raise RuntimeError(f'No printer found ({last_err})')
 
 
-def _print_ticket(data):
+def _print_ticket(p, data):
     title = data.get('title') or 'Ticket'
     lines = data.get('lines') or []
     qr_data = data.get('qrData')
+    logo = data.get('logo')
 
-    p = _make_printer()
+    logo_raster = asset_cache.get(logo) if logo else None
+    if logo_raster:
+        raster.send_payload(p, *logo_raster)
+    # Single code page select per ticket; lines are pre-encoded (cached)
+    p._raw(text_encoder.select())
     # Header
     p.set(align='center', bold=True, width=2, height=2)
-    p.textln(title)
+    p._raw(text_encoder.line(str(title)))
     p.set(align='left', bold=False, width=1, height=1)
-    p.textln('-' * 32)
-
-    for line in lines:
-        p.textln(str(line))
-
-    p.textln('-' * 32)
+    separator = '-' * 32
+    p._raw(text_encoder.lines([separator, *lines, separator]))
 
     # Small QR for 58mm: module_size ~3-4
     if qr_data:
@@ -99,23 +174,77 @@ def _print_ticket(data):
         qr.add_data(qr_data)
         qr.make(fit=True)
         img = qr.make_image(fill_color='black', back_color='white')
-        p.image(img, center=True)
+        raster.print_image(p, img)
 
-    p.textln('\n')
+    p._raw(text_encoder.line('\n'))
     p.cut()
 
 
 @app.get('/v1/health')
 def health():
-    return jsonify({'ok': True})
+    return jsonify({
+        'ok': True,
+        'raster': raster.last_transfer,
+        'codepage': text_encoder.codepage,
+        'text_cache': text_encoder.cache_info(),
+        'telemetry': events.stats(),
+    })
 
 
 @app.post('/v1/print-ticket')
 def print_ticket():
     try:
-        data = request.get_json(force=True, silent=False)
-        _print_ticket(data or {})
-        return jsonify({'ok': True})
+        data = request.get_json(force=True, silent=False) or {}
+        logo = data.get('logo')
+        if logo and asset_cache.get(logo) is None:
+            return jsonify({'ok': False, 'error': f'Unknown asset: {logo}'}), 400
+
+        client = request.headers.get('X-Kiosk-Id') or data.get('client') or request.remote_addr
+        job = print_queue.submit(client, data)
+        if not job.done.wait(float(os.environ.get('PRINTER_JOB_TIMEOUT', '60'))):
+            if print_queue.cancel(job):
+                # Removed from the queue: it will not print, safe to retry
+                return jsonify({'ok': False, 'error': 'Print job timed out in queue', 'job': job.id}), 504
+            # Already printing: report its real outcome instead of a retryable error
+            job.done.wait()
+        if job.error:
+            return jsonify({'ok': False, 'error': str(job.error), 'job': job.id}), 500
+        return jsonify({'ok': True, 'job': job.id, 'wait_ms': job.wait_ms})
+    except QueueFull as e:
+        return jsonify({'ok': False, 'error': str(e)}), 429
+    except Exception as e:  # noqa: BLE001
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+
+@app.get('/v1/queue')
+def queue_stats():
+    return jsonify({'ok': True, 'clients': print_queue.stats()})
+
+
+@app.get('/v1/assets')
+def list_assets():
+    return jsonify({'ok': True, 'assets': asset_cache.list()})
+
+
+def _admin_allowed():
+    # PRINTER_ADMIN_TOKEN protects admin endpoints when the agent is shared
+    # (PRINTER_BIND=0.0.0.0); without it they are only served to localhost
+    token = os.environ.get('PRINTER_ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.post('/v1/assets/<name>')
+def register_asset(name):
+    if not _admin_allowed():
+        return jsonify({'ok': False, 'error': 'Forbidden'}), 403
+    try:
+        upload = request.files.get('file')
+        content = upload.read() if upload else request.get_data()
+        if not content:
+            return jsonify({'ok': False, 'error': 'Empty image'}), 400
+        return jsonify({'ok': True, 'asset': asset_cache.register(name, content)})
     except Exception as e:  # noqa: BLE001
         return jsonify({'ok': False, 'error': str(e)}), 500
 
@@ -0,0 +1,79 @@
+import io
+import os
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from assets import AssetCache
+
+
+def _png(width=500, height=60):
+    img = Image.new('L', (width, height), 255)
+    for x in range(width):
+        for y in range(10, 50):
+            if (x // 10) % 2 == 0:
+                img.putpixel((x, y), 0)
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def paper_58(monkeypatch):
+    monkeypatch.setenv('ESC_POS_PAPER_MM', '58')
+    monkeypatch.delenv('ESC_POS_RASTER_MODE', raising=False)
+
+
+def test_register_and_get(tmp_path):
+    cache = AssetCache(str(tmp_path / 'cache'))
+    info = cache.register('logo', _png())
+
+    mode, payload = cache.get('logo')
+    assert info['name'] == 'logo' and info['mode'] == mode and info['bytes'] == len(payload)
+    assert info['key'].endswith('-384-auto')
+    assert cache.get('missing') is None
+    assert [a['name'] for a in cache.list()] == ['logo']
+
+
+def test_reload_from_disk(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    entry = AssetCache(cache_dir).register('logo', _png())
+
+    reloaded = AssetCache(cache_dir)
+    assert reloaded.describe('logo') == entry
+    assert reloaded.get('logo')[1] == AssetCache(cache_dir).get('logo')[1]
+
+
+def test_rerenders_when_paper_width_changes(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    narrow = AssetCache(cache_dir)
+    narrow.register('logo', _png())
+    narrow_payload = narrow.get('logo')[1]
+
+    monkeypatch.setenv('ESC_POS_PAPER_MM', '80')
+    wide = AssetCache(cache_dir)
+    assert wide.describe('logo')['key'].endswith('-576-auto')
+    assert wide.get('logo')[1] != narrow_payload
+    # La misma instancia también sigue la configuración actual
+    assert narrow.get('logo')[1] == wide.get('logo')[1]
+
+
+def test_bad_file_in_asset_dir_is_skipped(tmp_path):
+    asset_dir = tmp_path / 'assets'
+    asset_dir.mkdir()
+    (asset_dir / 'logo.png').write_bytes(_png())
+    (asset_dir / 'broken.png').write_bytes(b'not an image')
+
+    cache = AssetCache(str(tmp_path / 'cache'), str(asset_dir))
+    assert cache.get('logo') is not None
+    assert cache.get('broken') is None
+
+
+def test_failed_register_leaves_no_files(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = AssetCache(str(cache_dir))
+    with pytest.raises(Exception):
+        cache.register('broken', b'not an image')
+    assert os.listdir(cache_dir / 'src') == []
+    assert not list(cache_dir.glob('*.bin'))
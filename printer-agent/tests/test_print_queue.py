@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from print_queue import FairPrintQueue, QueueFull, parse_weights
+
+
+class FakePrinter:
+    def __init__(self, fail_writes=0):
+        self.fail_writes = fail_writes
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _queue(printed, **kwargs):
+    def print_job(printer, data):
+        if printer.fail_writes:
+            printer.fail_writes -= 1
+            raise OSError('Broken pipe')
+        printed.append(data)
+
+    kwargs.setdefault('open_printer', FakePrinter)
+    return FairPrintQueue(print_job=print_job, **kwargs)
+
+
+def _wait_all(jobs):
+    for job in jobs:
+        assert job.done.wait(2)
+
+
+def test_parse_weights():
+    assert parse_weights('caja-1=2, caja-2=1,caja-3') == {'caja-1': 2, 'caja-2': 1, 'caja-3': 1}
+    assert parse_weights('a=0') == {'a': 1}
+    assert parse_weights(None) == {}
+
+
+def test_weighted_round_robin_order():
+    printed = []
+    queue = _queue(printed, weights={'a': 2})
+    jobs = [queue.submit('a', f'a{i}') for i in range(6)]
+    jobs += [queue.submit('b', f'b{i}') for i in range(3)]
+    queue.start()
+    _wait_all(jobs)
+
+    # a (peso 2) imprime dos tickets por cada uno de b mientras ambos tienen cola
+    assert printed == ['b0', 'a0', 'a1', 'b1', 'a2', 'a3', 'b2', 'a4', 'a5']
+
+
+def test_per_client_limit():
+    printed = []
+    queue = _queue(printed, per_client_limit=2)
+    queue.submit('a', 1)
+    queue.submit('a', 2)
+    with pytest.raises(QueueFull):
+        queue.submit('a', 3)
+    # El límite es por cliente: otro kiosko sigue pudiendo encolar
+    queue.submit('b', 1)
+    stats = queue.stats()
+    assert stats['a']['queued'] == 2 and stats['a']['rejected'] == 1
+    assert stats['b']['queued'] == 1
+
+
+def test_cancel_removes_job_that_has_not_started():
+    gate = threading.Event()
+    printed = []
+
+    def print_job(printer, data):
+        gate.wait(2)
+        printed.append(data)
+
+    queue = FairPrintQueue(FakePrinter, print_job).start()
+    running = queue.submit('a', 'first')
+    while running.started_at is None:
+        time.sleep(0.001)
+    waiting = queue.submit('a', 'second')
+
+    assert queue.cancel(waiting)
+    assert not queue.cancel(running)  # ya se está imprimiendo
+    gate.set()
+    _wait_all([running, waiting])
+    time.sleep(0.05)
+    assert printed == ['first']
+    assert queue.stats()['a']['cancelled'] == 1
+
+
+def test_stale_reused_connection_is_reopened_once():
+    printed = []
+    printers = []
+
+    def open_printer():
+        printers.append(FakePrinter())
+        return printers[-1]
+
+    queue = _queue(printed, open_printer=open_printer).start()
+    _wait_all([queue.submit('a', 1)])
+    printers[0].fail_writes = 1  # la conexión cayó mientras estaba inactiva
+    job = queue.submit('a', 2)
+    _wait_all([job])
+
+    assert job.error is None and job.retried
+    assert printed == [1, 2]
+    assert len(printers) == 2 and printers[0].closed
+
+
+def test_fresh_connection_failure_is_not_retried():
+    printed = []
+    queue = _queue(printed, open_printer=lambda: FakePrinter(fail_writes=5)).start()
+    job = queue.submit('a', 1)
+    _wait_all([job])
+
+    assert isinstance(job.error, OSError) and not job.retried
+    assert queue.stats()['a']['failed'] == 1
+
+
+def test_idle_clients_are_forgotten_except_weighted():
+    printed = []
+    queue = _queue(printed, weights={'caja': 2}, client_idle_s=0.01).start()
+    _wait_all([queue.submit(client, 1) for client in ('kiosk-1', 'kiosk-2', 'caja')])
+    time.sleep(0.05)
+    _wait_all([queue.submit('kiosk-3', 1)])
+
+    assert sorted(queue.stats()) == ['caja', 'kiosk-3']
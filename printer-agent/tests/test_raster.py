@@ -0,0 +1,98 @@
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import raster
+
+
+def _bitmap(width, height, black):
+    img = Image.new('1', (width, height), 0)
+    for xy in black:
+        img.putpixel(xy, 1)
+    return img
+
+
+def _decode(payload):
+    """Interpreta los comandos raster que genera raster.py -> píxeles negros."""
+    black = set()
+    y = 0
+    i = 0
+    while i < len(payload):
+        if payload.startswith(b'\x1dv0\x00', i):
+            stride = payload[i + 4] | payload[i + 5] << 8
+            h = payload[i + 6] | payload[i + 7] << 8
+            i += 8
+            for row in range(h):
+                for bx in range(stride):
+                    byte = payload[i + row * stride + bx]
+                    for bit in range(8):
+                        if byte & (0x80 >> bit):
+                            black.add((bx * 8 + bit, y + row))
+            i += stride * h
+            y += h
+        elif payload.startswith(b'\x1bJ', i):
+            y += payload[i + 2]
+            i += 3
+        elif payload.startswith(b'\x1b3', i):
+            spacing = payload[i + 2]
+            i += 3
+        elif payload.startswith(b'\x1b2', i):
+            i += 2
+        elif payload.startswith(b'\x1b*\x21', i):
+            w = payload[i + 3] | payload[i + 4] << 8
+            band = payload[i + 5:i + 5 + 3 * w]
+            for x in range(w):
+                for dy in range(24):
+                    if band[3 * x + dy // 8] & (0x80 >> (dy % 8)):
+                        black.add((x, y + dy))
+            i += 5 + 3 * w
+            if payload[i:i + 1] == b'\n':
+                y += spacing
+                i += 1
+        else:
+            raise AssertionError(f'unexpected byte {payload[i]:#x} at {i}')
+    return black, y
+
+
+# Trazo arriba, tramo en blanco largo y un punto suelto abajo
+PIXELS = {(x, 0) for x in range(20)} | {(3, y) for y in range(10)} | {(17, 40)}
+
+
+@pytest.mark.parametrize('encoder', [raster.encode_gsv0, raster.encode_column])
+def test_encoders_round_trip(encoder):
+    bits = _bitmap(20, 41, PIXELS)
+    black, height = _decode(encoder(bits))
+    assert black == PIXELS
+    # Ambos modos avanzan el papel exactamente la altura de la imagen
+    assert height == bits.height
+
+
+@pytest.mark.parametrize('height', [24, 41, 47, 60])
+def test_encoders_advance_same_paper(height):
+    bits = _bitmap(16, height, {(0, 0), (15, height - 1)})
+    heights = {_decode(enc(bits))[1] for enc in raster.ENCODERS.values()}
+    assert heights == {height}
+
+
+def test_gsv0_replaces_blank_run_with_feed():
+    payload = raster.encode_gsv0(_bitmap(20, 41, PIXELS))
+    assert payload.count(b'\x1dv0\x00') == 2
+    assert b'\x1bJ' in payload
+
+
+def test_encode_image_picks_smallest_encoding():
+    img = Image.new('L', (64, 80), 255)
+    for x in range(10, 30):
+        img.putpixel((x, 30), 0)
+    chosen, payload = raster.encode_image(img)
+    assert chosen in raster.ENCODERS
+    candidates = {name: len(enc(raster._to_bits(img).crop((10, 30, 30, 31))))
+                  for name, enc in raster.ENCODERS.items()}
+    assert chosen == min(candidates, key=candidates.get)
+    assert payload.startswith(b'\x1ba\x01') and payload.endswith(b'\x1ba\x00')
+
+
+def test_encode_image_blank_is_only_feed():
+    chosen, payload = raster.encode_image(Image.new('L', (32, 300), 255))
+    assert chosen == 'feed'
+    assert payload == b'\x1bJ\xff\x1bJ\x2d'
@@ -0,0 +1,51 @@
+import pytest
+
+import textenc
+
+
+def test_cp858_spanish_and_euro():
+    enc = textenc.TextEncoder('cp858')
+    assert enc.line('í é €') == b'\xa1 \x82 \xd5\n'
+    assert enc.lines(['Matrícula: ABC1234', 2.5]) == b'Matr\xa1cula: ABC1234\n2.5\n'
+
+
+def test_single_code_page_select():
+    enc = textenc.TextEncoder('cp858')
+    assert enc.select() == b'\x1bt\x13'
+    # Las líneas no vuelven a cambiar de página
+    assert b'\x1bt' not in enc.lines(['Precio: 2,50 €', 'Método: Tarjeta'])
+
+
+def test_typographic_fallbacks():
+    enc = textenc.TextEncoder('cp858')
+    assert enc.line('“Zona” – ‘Azul’… fin—') == b'"Zona" - \'Azul\'... fin-\n'
+    # cp858 sí tiene espacio duro (0xFF): no se sustituye
+    assert enc.line('2,50\u00a0€') == b'2,50\xff\xd5\n'
+
+
+def test_fallbacks_only_where_needed():
+    # cp1252 tiene comillas tipográficas propias: no se sustituyen
+    enc = textenc.TextEncoder('cp1252')
+    assert enc.line('“€”') == b'\x93\x80\x94\n'
+    assert enc.select() == b'\x1bt\x10'
+
+
+def test_unencodable_replaced_and_lines_cached():
+    enc = textenc.TextEncoder('cp858')
+    assert enc.line('日本') == b'??\n'
+    enc.line('日本')
+    assert enc.cache_info()['hits'] >= 1
+
+
+def test_unknown_code_page_needs_table():
+    with pytest.raises(ValueError):
+        textenc.TextEncoder('cp775')
+    # Con la tabla indicada se acepta cualquier códec de Python
+    assert textenc.TextEncoder('cp775', table=7).select() == b'\x1bt\x07'
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('ESC_POS_CODEPAGE', 'cp850')
+    monkeypatch.setenv('ESC_POS_CODEPAGE_TABLE', '21')
+    enc = textenc.from_env()
+    assert enc.codepage == 'cp850' and enc.select() == b'\x1bt\x15'
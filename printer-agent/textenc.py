@@ -0,0 +1,75 @@
+"""
+Codificación de texto a la página de códigos configurada de la impresora.
+
+Sustituye al codificador "mágico" de python-escpos, que decide la página
+carácter a carácter y puede cambiarla en mitad de una línea: aquí se
+selecciona una sola página por ticket (`ESC t n`) y cada línea se traduce
+con una tabla precalculada y se guarda en una caché LRU.
+"""
+
+import functools
+import os
+
+ESC = b'\x1b'
+
+# Página de códigos -> número de tabla ESC t (numeración Epson)
+CODEPAGES = {
+    'cp437': 0,
+    'cp850': 2,
+    'cp860': 3,
+    'cp863': 4,
+    'cp865': 5,
+    'cp1252': 16,
+    'cp866': 17,
+    'cp852': 18,
+    'cp858': 19,
+}
+
+# Sustitutos para caracteres tipográficos que no existen en las páginas DOS
+FALLBACKS = {
+    '‘': "'", '’': "'", '“': '"', '”': '"',
+    '–': '-', '—': '-', '…': '...', '\u00a0': ' ',
+}
+
+
+class TextEncoder:
+    def __init__(self, codepage='cp858', table=None, cache_size=512):
+        self.codepage = codepage.lower()
+        if table is None:
+            if self.codepage not in CODEPAGES:
+                raise ValueError(f'Unknown code page: {codepage} (set ESC_POS_CODEPAGE_TABLE)')
+            table = CODEPAGES[self.codepage]
+        self.table = table
+        # Solo se traducen los caracteres que la página no puede representar
+        self._translation = str.maketrans({
+            ch: sub for ch, sub in FALLBACKS.items() if not self._encodable(ch)
+        })
+        self.line = functools.lru_cache(maxsize=cache_size)(self._encode_line)
+
+    def _encodable(self, ch):
+        try:
+            ch.encode(self.codepage)
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    def select(self):
+        """Secuencia `ESC t n` que selecciona la página (una vez por ticket)."""
+        return ESC + b't' + bytes([self.table])
+
+    def _encode_line(self, text):
+        return text.translate(self._translation).encode(self.codepage, errors='replace') + b'\n'
+
+    def lines(self, texts):
+        return b''.join(self.line(str(t)) for t in texts)
+
+    def cache_info(self):
+        return self.line.cache_info()._asdict()
+
+
+def from_env():
+    table = os.environ.get('ESC_POS_CODEPAGE_TABLE')
+    return TextEncoder(
+        os.environ.get('ESC_POS_CODEPAGE', 'cp858'),
+        table=int(table) if table else None,
+    )
@@ -13,6 +13,7 @@ import re
 from typing import Optional, Callable
 import subprocess
 import signal
+import socket
 import logging
 
 try:
@@ -30,12 +31,17 @@ except ImportError:
     PYUDEV_AVAILABLE = False
     print("Warning: pyudev no disponible, usando detección básica")
 
+from scanner_registry import sysfs_path
+
+# Escáner simulado por UDP (solo para pruebas de carga, ver loadtest/)
+SIMULATED_UDP_PORT = int(os.environ.get('QR_SCANNER_SIMULATED_UDP_PORT', '0'))
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class QrScannerService:
-    def __init__(self):
+    def __init__(self, history=None, registry=None, telemetry=None):
         self.scanner_connected = False
         self.scanner_device = None
         self.scanner_process = None
@@ -45,6 +51,21 @@ class QrScannerService:
         self.running = True
         self.current_qr_buffer = ""
         self.scanner_thread = None
+        # Historial de escaneos (ScanHistory opcional)
+        self.history = history
+        self._scan_started_at = None
+        # Protege current_qr_buffer y avisa a scan_qr() de cada código completo
+        self._buffer_cond = threading.Condition()
+        self._completed_scans = 0
+        self._last_completed_code = None
+        # Registro de huellas de escáneres conocidos (ScannerRegistry opcional)
+        self.registry = registry
+        self._known_device = None
+        self._known_sysfs = None
+        self._active_device = None
+        self.warm_started = False
+        # Eventos estructurados para telemetría (Telemetry opcional)
+        self.telemetry = telemetry
         
         # Configurar señales para shutdown limpio
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -55,6 +76,11 @@ class QrScannerService:
         logger.info(f"Recibida señal {signum}, terminando...")
         self.running = False
         self.stop_monitoring()
+        # Volcado final del historial: el thread periódico es daemon
+        if self.history:
+            self.history.snapshot()
+        if self.registry is not None:
+            self.registry.flush()
         sys.exit(0)
     
     def set_callbacks(self, on_status_changed: Callable[[bool], None], 
@@ -71,6 +97,10 @@ class QrScannerService:
         self.monitoring = True
         logger.info("Iniciando monitoreo de escáneres QR USB...")
         
+        # Arranque en caliente: abrir directamente el escáner ya conocido
+        if self._warm_start():
+            return
+        
         # Iniciar thread de monitoreo
         monitor_thread = threading.Thread(target=self._monitor_usb_devices, daemon=True)
         monitor_thread.start()
@@ -78,6 +108,64 @@ class QrScannerService:
         # Verificar estado inicial
         self._check_scanner_status()
     
+    def _warm_start(self) -> bool:
+        """Abre el escáner registrado y empieza a leer sin detección completa"""
+        device = self._find_known_scanner()
+        if device is None:
+            return False
+        
+        logger.info(f"Arranque en caliente con escáner conocido: {device.name} ({device.path})")
+        self.warm_started = True
+        self.scanner_connected = True
+        if self.on_status_changed:
+            self.on_status_changed(True)
+        self._start_qr_reading()
+        
+        monitor_thread = threading.Thread(target=self._monitor_usb_devices, daemon=True)
+        monitor_thread.start()
+        return True
+    
+    def _find_known_scanner(self):
+        """Busca entre los dispositivos evdev uno que coincida con una huella registrada"""
+        if not EVDEV_AVAILABLE or not self.registry:
+            return None
+        
+        # Primero las rutas recordadas, luego el resto por si cambió el eventN
+        paths = self.registry.candidate_paths()
+        paths += [p for p in evdev.list_devices() if p not in paths]
+        for path in paths:
+            try:
+                device = evdev.InputDevice(path)
+            except OSError:
+                continue
+            if self.registry.matches(device):
+                self._known_device = device
+                self._known_sysfs = sysfs_path(device.path)
+                self.scanner_device = device.path
+                return device
+            device.close()
+        return None
+    
+    def _known_device_present(self) -> bool:
+        """Comprueba que el eventN recordado sigue siendo el mismo dispositivo
+
+        Los números eventN se reutilizan: tras desconectar el escáner, otro
+        dispositivo puede ocupar la misma ruta. La ruta sysfs real cambia en
+        cada conexión, así que se compara con la guardada al encontrarlo.
+        """
+        path = self._known_device.path
+        return os.path.exists(path) and sysfs_path(path) == self._known_sysfs
+
+    def _forget_known_device(self):
+        """Cierra el InputDevice obsoleto y olvida el escáner conocido"""
+        device, self._known_device = self._known_device, None
+        self._known_sysfs = None
+        self.scanner_device = None
+        try:
+            device.close()
+        except Exception:
+            pass
+
     def stop_monitoring(self):
         """Detiene el monitoreo de dispositivos USB"""
         self.monitoring = False
@@ -105,6 +193,13 @@ class QrScannerService:
                     else:
                         logger.info("Escáner QR desconectado")
                         self._stop_qr_reading()
+                elif current_status and self._known_device is not None and not (
+                        self.scanner_thread and self.scanner_thread.is_alive()):
+                    # Desconexión y reconexión entre dos comprobaciones: el
+                    # estado no cambió pero el lector terminó con el
+                    # dispositivo anterior
+                    logger.info("Escáner QR reconectado, reanudando lectura")
+                    self._start_qr_reading()
                 
                 # Esperar antes de la siguiente verificación
                 time.sleep(2)
@@ -115,6 +210,18 @@ class QrScannerService:
     
     def _check_scanner_status(self) -> bool:
         """Verifica si hay un escáner QR conectado usando múltiples métodos"""
+        if SIMULATED_UDP_PORT:
+            return True
+        
+        # Escáner conocido aún presente: no hace falta la detección completa
+        if self._known_device is not None:
+            if self._known_device_present():
+                return True
+            logger.info("El escáner conocido ya no está presente")
+            self._forget_known_device()
+        if self._find_known_scanner() is not None:
+            return True
+        
         try:
             # Método 1: Usar pyudev si está disponible
             if PYUDEV_AVAILABLE:
@@ -247,7 +354,9 @@ class QrScannerService:
     def _read_qr_codes(self):
         """Lee códigos QR desde dispositivos de entrada"""
         try:
-            if EVDEV_AVAILABLE:
+            if SIMULATED_UDP_PORT:
+                self._read_with_udp(SIMULATED_UDP_PORT)
+            elif EVDEV_AVAILABLE:
                 self._read_with_evdev()
             else:
                 self._read_with_stdin()
@@ -257,22 +366,26 @@ class QrScannerService:
     def _read_with_evdev(self):
         """Lee códigos QR usando evdev"""
         try:
-            # Buscar dispositivos de entrada disponibles
-            input_devices = []
-            for device_path in evdev.list_devices():
-                try:
-                    device = evdev.InputDevice(device_path)
-                    if evdev.ecodes.EV_KEY in device.capabilities():
-                        input_devices.append(device)
-                except:
-                    continue
-            
-            if not input_devices:
-                logger.warning("No se encontraron dispositivos de entrada para evdev")
-                return
-            
-            # Usar el primer dispositivo disponible
-            device = input_devices[0]
+            if self._known_device is not None:
+                device = self._known_device
+            else:
+                # Buscar dispositivos de entrada disponibles
+                input_devices = []
+                for device_path in evdev.list_devices():
+                    try:
+                        device = evdev.InputDevice(device_path)
+                        if evdev.ecodes.EV_KEY in device.capabilities():
+                            input_devices.append(device)
+                    except:
+                        continue
+                
+                if not input_devices:
+                    logger.warning("No se encontraron dispositivos de entrada para evdev")
+                    return
+                
+                # Usar el primer dispositivo disponible
+                device = input_devices[0]
+            self._active_device = device
             logger.info(f"Leyendo desde dispositivo: {device.name}")
             
             # Leer eventos del dispositivo
@@ -286,18 +399,56 @@ class QrScannerService:
                         # Procesar tecla presionada
                         if key_event.keycode == evdev.ecodes.KEY_ENTER:
                             # Enter indica fin del código QR
-                            if self.current_qr_buffer:
-                                self._process_qr_code(self.current_qr_buffer)
-                                self.current_qr_buffer = ""
+                            self._complete_code(device.name)
                         else:
                             # Añadir carácter al buffer
                             char = self._keycode_to_char(key_event.keycode)
                             if char:
-                                self.current_qr_buffer += char
+                                self._append_char(char)
                 
         except Exception as e:
             logger.error(f"Error en lectura evdev: {e}")
     
+    def _append_char(self, char: str):
+        """Añade un carácter leído al buffer del código en curso"""
+        with self._buffer_cond:
+            if not self.current_qr_buffer:
+                self._scan_started_at = time.time()
+            self.current_qr_buffer += char
+    
+    def _complete_code(self, device_name: Optional[str] = None):
+        """Cierra el código en curso (Enter) y lo procesa"""
+        with self._buffer_cond:
+            qr_code = self.current_qr_buffer
+            started_at = self._scan_started_at
+            self.current_qr_buffer = ""
+            self._scan_started_at = None
+            if qr_code:
+                self._completed_scans += 1
+                self._last_completed_code = qr_code
+                self._buffer_cond.notify_all()
+        if qr_code:
+            self._process_qr_code(qr_code, device_name, started_at)
+    
+    def _read_with_udp(self, port: int):
+        """Lee códigos QR simulados desde datagramas UDP (pruebas de carga)"""
+        logger.info(f"Usando escáner simulado en UDP 127.0.0.1:{port}")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", port))
+        sock.settimeout(1)
+        try:
+            while self.running and self.scanner_connected:
+                try:
+                    data, _ = sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                # Se teclea carácter a carácter, igual que un escáner HID
+                for char in data.decode("utf-8", "ignore").strip():
+                    self._append_char(char)
+                self._complete_code("simulated-udp")
+        finally:
+            sock.close()
+    
     def _read_with_stdin(self):
         """Lee códigos QR desde stdin (fallback)"""
         logger.info("Usando stdin para lectura de códigos QR")
@@ -321,11 +472,31 @@ class QrScannerService:
         }
         return key_mapping.get(keycode)
     
-    def _process_qr_code(self, qr_code: str):
+    def _process_qr_code(self, qr_code: str, device_name: Optional[str] = None,
+                         started_at: Optional[float] = None):
         """Procesa un código QR escaneado"""
         try:
             # Validar formato del código QR (debe ser un descuento)
-            if self._is_valid_discount(qr_code):
+            valid = self._is_valid_discount(qr_code)
+            latency_ms = None
+            if started_at:
+                latency_ms = round((time.time() - started_at) * 1000, 1)
+            if self.history is not None:
+                self.history.record(qr_code, valid, device=device_name, latency_ms=latency_ms)
+            if self.telemetry is not None:
+                self.telemetry.emit("scan", device=device_name, length=len(qr_code), latency_ms=latency_ms)
+                self.telemetry.emit("validation", valid=valid,
+                                    amount=abs(float(qr_code)) if valid else None)
+            
+            # Un escaneo válido confirma que el dispositivo activo es el escáner
+            device = self._active_device
+            if valid and self.registry is not None and device is not None and device.name == device_name:
+                cadence_ms = None
+                if latency_ms is not None and len(qr_code) > 1:
+                    cadence_ms = latency_ms / (len(qr_code) - 1)
+                self.registry.learn(device, cadence_ms)
+
+            if valid:
                 logger.info(f"Código QR válido escaneado: {qr_code}")
                 if self.on_qr_scanned:
                     self.on_qr_scanned(qr_code)
@@ -355,20 +526,16 @@ class QrScannerService:
             raise Exception("No hay escáner QR conectado")
         
         logger.info("Esperando código QR...")
-        start_time = time.time()
         
-        # Esperar a que se escanee un código QR
-        while time.time() - start_time < timeout:
-            if not self.running:
-                break
-            
-            # Verificar si hay un código QR en el buffer
-            if self.current_qr_buffer:
-                qr_code = self.current_qr_buffer
-                self.current_qr_buffer = ""
-                return qr_code
-            
-            time.sleep(0.1)
+        # Esperar a que el lector complete un código QR (Enter)
+        with self._buffer_cond:
+            seen = self._completed_scans
+            completed = self._buffer_cond.wait_for(
+                lambda: self._completed_scans != seen or not self.running,
+                timeout=timeout
+            )
+            if completed and self._completed_scans != seen:
+                return self._last_completed_code
         
         raise Exception("Timeout: No se escaneó ningún código QR")
     
@@ -379,6 +546,8 @@ class QrScannerService:
             "scanner_device": self.scanner_device,
             "monitoring": self.monitoring,
             "running": self.running,
+            "warm_started": self.warm_started,
+            "known_scanners": len(self.registry) if self.registry is not None else 0,
             "evdev_available": EVDEV_AVAILABLE,
             "pyudev_available": PYUDEV_AVAILABLE
         }
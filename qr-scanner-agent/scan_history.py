@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Historial acotado de escaneos (ring buffer)
+Guarda los últimos N escaneos en ranuras preasignadas y permite consultas
+incrementales por número de secuencia (GET /v1/scans?since=<seq>)
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ScanRecord:
+    """Registro compacto de un escaneo"""
+    __slots__ = ("seq", "timestamp", "device", "code", "valid", "latency_ms")
+
+    def __init__(self, seq: int, timestamp: float, device: Optional[str],
+                 code: str, valid: bool, latency_ms: Optional[float]):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.device = device
+        self.code = code
+        self.valid = valid
+        self.latency_ms = latency_ms
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ScanHistory:
+    """Ring buffer de capacidad fija con secuencia monótona"""
+
+    def __init__(self, capacity: int = 256, snapshot_path: Optional[str] = None):
+        self.capacity = max(1, capacity)
+        self.snapshot_path = snapshot_path
+        self._slots: List[Optional[ScanRecord]] = [None] * self.capacity
+        self._last_seq = 0
+        self._snapshot_seq = 0
+        self._lock = threading.Lock()
+        # Serializa los volcados (thread periódico, señal de parada, atexit)
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread = None
+        if self.snapshot_path:
+            self._load_snapshot()
+
+    def record(self, code: str, valid: bool, device: Optional[str] = None,
+               latency_ms: Optional[float] = None,
+               timestamp: Optional[float] = None) -> ScanRecord:
+        """Añade un escaneo, sobrescribiendo el más antiguo si está lleno"""
+        with self._lock:
+            self._last_seq += 1
+            rec = ScanRecord(self._last_seq, timestamp or time.time(), device,
+                             code, valid, latency_ms)
+            self._slots[rec.seq % self.capacity] = rec
+            return rec
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def oldest_seq(self) -> int:
+        """Secuencia más antigua aún disponible (0 si está vacío)"""
+        with self._lock:
+            return self._oldest_seq()
+
+    def _oldest_seq(self) -> int:
+        if self._last_seq == 0:
+            return 0
+        return max(1, self._last_seq - self.capacity + 1)
+
+    def since(self, seq: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Devuelve los escaneos con secuencia > seq, del más antiguo al más nuevo"""
+        with self._lock:
+            return self._since(seq, limit)
+
+    def _since(self, seq: int, limit: Optional[int]) -> List[dict]:
+        first = max(seq + 1, self._last_seq - self.capacity + 1, 1)
+        last = self._last_seq
+        if limit is not None:
+            last = min(last, first + max(0, limit) - 1)
+        out = []
+        for s in range(first, last + 1):
+            rec = self._slots[s % self.capacity]
+            if rec is not None and rec.seq == s:
+                out.append(rec.to_dict())
+        return out
+
+    def page(self, seq: int = 0, limit: Optional[int] = None) -> Tuple[List[dict], int, int, int]:
+        """Consulta incremental coherente: (escaneos, cursor, más antiguo, más nuevo)
+
+        El cursor es la secuencia del último escaneo devuelto (o `seq` si no
+        hay ninguno) y es lo que el cliente debe enviar como `since` en la
+        siguiente consulta. Todo se lee bajo el mismo lock, así que un
+        escaneo registrado a la vez no se salta.
+        """
+        with self._lock:
+            records = self._since(seq, limit)
+            cursor = records[-1]["seq"] if records else seq
+            return records, cursor, self._oldest_seq(), self._last_seq
+
+    def snapshot(self):
+        """Guarda el contenido en disco si hubo cambios desde el último volcado"""
+        if not self.snapshot_path:
+            return
+        with self._snapshot_lock:
+            if self._snapshot_seq == self._last_seq:
+                return
+            with self._lock:
+                last_seq = self._last_seq
+            records = self.since(0)
+            tmp = self.snapshot_path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump({"last_seq": last_seq, "records": records}, f)
+                os.replace(tmp, self.snapshot_path)
+                self._snapshot_seq = last_seq
+            except OSError as e:
+                logger.error(f"Error guardando historial de escaneos: {e}")
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Error cargando historial de escaneos: {e}")
+            return
+
+        with self._lock:
+            for item in data.get("records", [])[-self.capacity:]:
+                rec = ScanRecord(**{name: item.get(name) for name in ScanRecord.__slots__})
+                self._slots[rec.seq % self.capacity] = rec
+            self._last_seq = int(data.get("last_seq", 0))
+            self._snapshot_seq = self._last_seq
+        logger.info(f"Historial de escaneos restaurado (seq {self._last_seq})")
+
+    def start_snapshots(self, interval: float = 10.0):
+        """Vuelca periódicamente el historial a disco en un thread de fondo
+        y una última vez al terminar el proceso"""
+        if not self.snapshot_path or self._snapshot_thread:
+            return
+        atexit.register(self.snapshot)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.snapshot()
+
+        self._snapshot_thread = threading.Thread(target=run, daemon=True)
+        self._snapshot_thread.start()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Registro persistente de huellas de escáneres confirmados
+Cada escaneo válido desde un dispositivo evdev aprende su huella
+(VID:PID, serie, ruta sysfs, cadencia de tecleo) y la guarda en disco, de
+modo que al arrancar se abre directamente el escáner conocido sin repetir
+la detección completa. El fichero solo se reescribe cuando aparece una
+huella nueva o cambia su ubicación; los contadores se vuelcan como mucho
+cada SAVE_INTERVAL segundos
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SAVE_INTERVAL = 300.0
+
+# Campos que identifican dónde está conectado el escáner
+_LOCATION_FIELDS = ("serial", "name", "phys", "dev_path", "sysfs_path")
+
+
+def sysfs_path(dev_path: str) -> Optional[str]:
+    """Ruta sysfs real del dispositivo /dev/input/eventN"""
+    link = os.path.join("/sys/class/input", os.path.basename(dev_path), "device")
+    try:
+        return os.path.realpath(link)
+    except OSError:
+        return None
+
+
+def fingerprint_key(vid: int, pid: int, serial: Optional[str]) -> str:
+    return f"{vid:04x}:{pid:04x}:{serial or ''}"
+
+
+class ScannerRegistry:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.fingerprints = {}
+        self._saved_at = 0.0
+        if self.path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self.fingerprints = json.load(f).get("scanners", {})
+            logger.info(f"Registro de escáneres cargado: {len(self.fingerprints)} huella(s)")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f"Error cargando registro de escáneres: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"scanners": self.fingerprints}, f, indent=2)
+            os.replace(tmp, self.path)
+            self._saved_at = time.monotonic()
+        except OSError as e:
+            logger.error(f"Error guardando registro de escáneres: {e}")
+
+    def learn(self, device, cadence_ms: Optional[float] = None):
+        """Registra (o refuerza) la huella de un dispositivo evdev que escaneó un código válido"""
+        info = device.info
+        key = fingerprint_key(info.vendor, info.product, device.uniq)
+        with self._lock:
+            entry = self.fingerprints.get(key, {"scans": 0, "cadence_ms": None})
+            location = tuple(entry.get(name) for name in _LOCATION_FIELDS)
+            if cadence_ms is not None:
+                # Media móvil exponencial de la cadencia entre teclas
+                prev = entry.get("cadence_ms")
+                entry["cadence_ms"] = round(cadence_ms if prev is None else 0.8 * prev + 0.2 * cadence_ms, 2)
+            entry.update({
+                "vid": f"{info.vendor:04x}",
+                "pid": f"{info.product:04x}",
+                "serial": device.uniq or None,
+                "name": device.name,
+                "phys": device.phys,
+                "dev_path": device.path,
+                "sysfs_path": sysfs_path(device.path),
+                "scans": entry["scans"] + 1,
+                "last_seen": time.time(),
+            })
+            is_new = key not in self.fingerprints
+            self.fingerprints[key] = entry
+            # Se llama en cada escaneo desde el hilo lector: solo se escribe a
+            # disco si la huella es nueva, si el escáner cambió de ubicación o
+            # si los contadores llevan tiempo sin volcarse
+            moved = location != tuple(entry.get(name) for name in _LOCATION_FIELDS)
+            if is_new or moved or time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                self._save()
+        if is_new:
+            logger.info(f"Nueva huella de escáner registrada: {key} ({device.name})")
+
+    def flush(self):
+        """Vuelca a disco los contadores pendientes (al terminar el proceso)"""
+        with self._lock:
+            if self.fingerprints:
+                self._save()
+
+    def matches(self, device) -> bool:
+        """Indica si un dispositivo evdev corresponde a una huella conocida"""
+        info = device.info
+        with self._lock:
+            if fingerprint_key(info.vendor, info.product, device.uniq) in self.fingerprints:
+                return True
+            # Sin número de serie fiable: basta con VID:PID
+            vid_pid = f"{info.vendor:04x}:{info.product:04x}:"
+            return any(k.startswith(vid_pid) and not v.get("serial")
+                       for k, v in self.fingerprints.items())
+
+    def candidate_paths(self):
+        """Rutas /dev/input conocidas, de la más usada a la menos"""
+        with self._lock:
+            entries = sorted(self.fingerprints.values(), key=lambda e: e.get("scans", 0), reverse=True)
+        return [e["dev_path"] for e in entries if e.get("dev_path")]
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
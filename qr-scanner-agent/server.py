@@ -5,47 +5,74 @@ Se integra con el printer-agent para detección automática
 """
 
 import os
+import sys
 import json
 import time
 import threading
 from flask import Flask, request, jsonify
+
+# Módulos compartidos: junto a este fichero al instalar o en el repositorio
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agent-common'))
+import profiler
+import telemetry
 from qr_scanner_service import QrScannerService
+from scan_history import ScanHistory
+from state_store import StateStore
+from scanner_registry import ScannerRegistry
 
 app = Flask(__name__)
+profiler.register(app)
+
+# Historial acotado de escaneos (opcionalmente persistido en disco)
+scan_history = ScanHistory(
+    capacity=int(os.environ.get('QR_SCANNER_HISTORY_SIZE', '256')),
+    snapshot_path=os.environ.get('QR_SCANNER_HISTORY_FILE')
+)
+
+# Huellas de escáneres confirmados (arranque en caliente)
+scanner_registry = ScannerRegistry(os.environ.get(
+    'QR_SCANNER_REGISTRY_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'known_scanners.json')
+))
+
+# Eventos de escaneo y hardware para telemetría (spool local + subida por lotes)
+events = telemetry.from_env('qr-scanner-agent', os.path.dirname(os.path.abspath(__file__)))
 
 # Instancia del servicio de escáner QR
-qr_service = QrScannerService()
+qr_service = QrScannerService(history=scan_history, registry=scanner_registry, telemetry=events)
 
-# Estado del servicio
-service_status = {
+# Estado del servicio: un único escritor publica snapshots inmutables
+status_store = StateStore({
     "scanner_connected": False,
     "last_qr_code": None,
     "last_scan_time": None,
     "total_scans": 0,
     "current_discount": None
-}
+})
 
 def on_scanner_status_changed(connected: bool):
     """Callback cuando cambia el estado del escáner"""
-    global service_status
-    service_status["scanner_connected"] = connected
+    status_store.update(scanner_connected=connected)
+    events.emit("hardware", device="scanner", state="connected" if connected else "disconnected")
     print(f"Estado del escáner cambiado: {'Conectado' if connected else 'Desconectado'}")
 
 def on_qr_scanned(qr_code: str):
     """Callback cuando se escanea un código QR"""
-    global service_status
-    service_status["last_qr_code"] = qr_code
-    service_status["last_scan_time"] = time.time()
-    service_status["total_scans"] += 1
-    
     # Procesar el descuento
     try:
         discount_amount = float(qr_code)
-        service_status["current_discount"] = discount_amount
         print(f"Código QR escaneado: {qr_code} (Descuento: {discount_amount}€)")
     except ValueError:
+        discount_amount = None
         print(f"Código QR escaneado: {qr_code} (Formato inválido)")
-        service_status["current_discount"] = None
+
+    # Todos los campos del escaneo se publican en un único snapshot
+    status_store.update(lambda state: {
+        "last_qr_code": qr_code,
+        "last_scan_time": time.time(),
+        "total_scans": state["total_scans"] + 1,
+        "current_discount": discount_amount
+    })
 
 @app.route('/v1/health', methods=['GET'])
 def health():
@@ -53,15 +80,18 @@ def health():
     return jsonify({
         "ok": True,
         "service": "qr-scanner-agent",
+        "telemetry": events.stats(),
         "timestamp": time.time()
     })
 
 @app.route('/v1/status', methods=['GET'])
 def status():
     """Endpoint para obtener el estado del servicio"""
+    snapshot = status_store.snapshot()
     return jsonify({
         "ok": True,
-        "status": service_status,
+        "status": snapshot.to_dict(),
+        "version": snapshot.version,
         "service_status": qr_service.get_status()
     })
 
@@ -128,10 +158,34 @@ def check_scanner():
 def get_current_discount():
     """Endpoint para obtener el descuento actual"""
     try:
+        snapshot = status_store.snapshot()
         return jsonify({
             "ok": True,
-            "current_discount": service_status["current_discount"],
-            "last_scan_time": service_status["last_scan_time"],
+            "current_discount": snapshot.data["current_discount"],
+            "last_scan_time": snapshot.data["last_scan_time"],
+            "version": snapshot.version,
+            "timestamp": time.time()
+        })
+    except Exception as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/v1/scans', methods=['GET'])
+def get_scans():
+    """Endpoint para obtener los escaneos posteriores a una secuencia"""
+    try:
+        since = request.args.get('since', default=0, type=int)
+        limit = request.args.get('limit', default=None, type=int)
+        scans, cursor, oldest_seq, newest_seq = scan_history.page(since, limit)
+        return jsonify({
+            "ok": True,
+            "scans": scans,
+            # Cursor para la siguiente consulta (último escaneo devuelto)
+            "last_seq": cursor,
+            "newest_seq": newest_seq,
+            "oldest_seq": oldest_seq,
             "timestamp": time.time()
         })
     except Exception as e:
@@ -142,12 +196,39 @@ def get_current_discount():
 
 @app.route('/v1/clear-discount', methods=['POST'])
 def clear_discount():
-    """Endpoint para limpiar el descuento actual"""
+    """Endpoint para limpiar el descuento actual
+
+    Si se envía {"version": N} (obtenida de /v1/current-discount), solo se
+    limpia si no ha habido cambios desde entonces; así no se borra un
+    descuento escaneado después de que el cliente lo leyera.
+    """
     try:
-        service_status["current_discount"] = None
+        data = request.get_json(force=True, silent=True) or {}
+        expected_version = data.get('version')
+        if expected_version is None:
+            snapshot = status_store.update(current_discount=None)
+        else:
+            try:
+                if isinstance(expected_version, bool):
+                    raise ValueError(expected_version)
+                expected_version = int(expected_version)
+            except (TypeError, ValueError):
+                return jsonify({
+                    "ok": False,
+                    "error": "Versión inválida"
+                }), 400
+            cleared, snapshot = status_store.compare_and_set(expected_version, current_discount=None)
+            if not cleared:
+                return jsonify({
+                    "ok": False,
+                    "error": "El estado ha cambiado desde la versión indicada",
+                    "current_discount": snapshot.data["current_discount"],
+                    "version": snapshot.version
+                }), 409
         return jsonify({
             "ok": True,
             "message": "Descuento limpiado",
+            "version": snapshot.version,
             "timestamp": time.time()
         })
     except Exception as e:
@@ -200,6 +281,7 @@ def start_qr_service():
     
     service_thread = threading.Thread(target=run_service, daemon=True)
     service_thread.start()
+    scan_history.start_snapshots(float(os.environ.get('QR_SCANNER_HISTORY_INTERVAL', '10')))
     print("Servicio de escáner QR iniciado en background")
 
 if __name__ == '__main__':
@@ -216,10 +298,12 @@ if __name__ == '__main__':
     print("  GET  /v1/status - Estado del escáner")
     print("  GET  /v1/check-scanner - Verificar escáner")
     print("  GET  /v1/current-discount - Obtener descuento actual")
+    print("  GET  /v1/scans?since=<seq> - Historial de escaneos")
     print("  POST /v1/scan - Escanear código QR")
     print("  POST /v1/clear-discount - Limpiar descuento")
     print("  POST /v1/start-monitoring - Iniciar monitoreo")
     print("  POST /v1/stop-monitoring - Detener monitoreo")
+    print("  POST /v1/debug/profile?seconds=N - Perfilado (requiere DEBUG_PROFILE_TOKEN)")
     
     app.run(host=bind_host, port=bind_port, debug=False)
 
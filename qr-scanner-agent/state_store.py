@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Almacén de estado con snapshots inmutables (copy-on-write)
+Los escritores se serializan con un lock y publican un snapshot nuevo con
+un contador de versión; los lectores solo leen la referencia actual, así
+que siempre ven un estado coherente sin bloquear
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple, Optional, Tuple, Union
+
+
+class Snapshot(NamedTuple):
+    """Vista inmutable del estado en una versión concreta"""
+    version: int
+    data: Mapping
+
+    def to_dict(self) -> dict:
+        return dict(self.data)
+
+
+Changes = Union[Mapping, Callable[[Mapping], Mapping]]
+
+
+class StateStore:
+    def __init__(self, initial: Optional[Mapping] = None):
+        self._write_lock = threading.Lock()
+        self._snapshot = Snapshot(0, MappingProxyType(dict(initial or {})))
+
+    def snapshot(self) -> Snapshot:
+        """Devuelve el snapshot actual (lectura atómica, sin lock)"""
+        return self._snapshot
+
+    def _publish(self, current: Snapshot, changes: Changes) -> Snapshot:
+        if callable(changes):
+            changes = changes(current.data)
+        data = dict(current.data)
+        data.update(changes)
+        self._snapshot = Snapshot(current.version + 1, MappingProxyType(data))
+        return self._snapshot
+
+    def update(self, changes: Optional[Changes] = None, **kwargs) -> Snapshot:
+        """Aplica cambios y publica un nuevo snapshot.
+
+        `changes` puede ser un dict o una función que recibe el estado
+        actual y devuelve los cambios (para lectura-modificación-escritura).
+        """
+        with self._write_lock:
+            current = self._snapshot
+            if changes is None:
+                changes = kwargs
+            elif kwargs:
+                raise TypeError("Usar 'changes' o argumentos con nombre, no ambos")
+            return self._publish(current, changes)
+
+    def compare_and_set(self, expected_version: int, **changes) -> Tuple[bool, Snapshot]:
+        """Aplica los cambios solo si la versión actual es la esperada"""
+        with self._write_lock:
+            current = self._snapshot
+            if current.version != expected_version:
+                return False, current
+            return True, self._publish(current, changes)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del agente se importan como scripts sueltos (ver server.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
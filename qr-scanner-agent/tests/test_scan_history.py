@@ -0,0 +1,62 @@
+from scan_history import ScanHistory
+
+
+def _fill(history, n):
+    for i in range(n):
+        history.record(f'CODE-{i + 1}', valid=True, device='scanner')
+
+
+def test_since_returns_newer_scans_in_order():
+    history = ScanHistory(capacity=8)
+    _fill(history, 5)
+    assert [r['seq'] for r in history.since(2)] == [3, 4, 5]
+    assert [r['code'] for r in history.since(0, limit=2)] == ['CODE-1', 'CODE-2']
+    assert history.since(5) == []
+
+
+def test_wraparound_keeps_last_capacity_scans():
+    history = ScanHistory(capacity=4)
+    _fill(history, 10)
+    assert history.last_seq == 10
+    assert history.oldest_seq() == 7
+    assert [r['seq'] for r in history.since(0)] == [7, 8, 9, 10]
+    # Un cliente que se quedó atrás recibe lo que queda, sin huecos inventados
+    assert [r['seq'] for r in history.since(3, limit=2)] == [7, 8]
+
+
+def test_page_cursor_is_last_returned_seq():
+    history = ScanHistory(capacity=8)
+    _fill(history, 10)
+
+    scans, cursor, oldest, newest = history.page(0, limit=2)
+    assert [r['seq'] for r in scans] == [3, 4]
+    assert (cursor, oldest, newest) == (4, 3, 10)
+
+    # Siguiendo el cursor se leen todos los escaneos sin saltos
+    seen = [r['seq'] for r in scans]
+    while cursor < newest:
+        scans, cursor, _, newest = history.page(cursor, limit=3)
+        seen += [r['seq'] for r in scans]
+    assert seen == list(range(3, 11))
+
+    # Sin escaneos nuevos el cursor no se mueve
+    assert history.page(10) == ([], 10, 3, 10)
+
+
+def test_empty_history():
+    history = ScanHistory(capacity=4)
+    assert history.oldest_seq() == 0
+    assert history.since(0) == []
+
+
+def test_snapshot_restores_sequence(tmp_path):
+    path = str(tmp_path / 'history.json')
+    history = ScanHistory(capacity=4, snapshot_path=path)
+    _fill(history, 6)
+    history.snapshot()
+
+    restored = ScanHistory(capacity=4, snapshot_path=path)
+    assert restored.last_seq == 6
+    assert restored.since(0) == history.since(0)
+    restored.record('NEXT', valid=False)
+    assert restored.last_seq == 7
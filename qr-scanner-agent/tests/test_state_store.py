@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from state_store import StateStore
+
+
+def test_compare_and_set_applies_on_expected_version():
+    store = StateStore({'current_discount': 'DESC-10', 'count': 0})
+    version = store.snapshot().version
+
+    ok, snapshot = store.compare_and_set(version, current_discount=None)
+
+    assert ok
+    assert snapshot.version == version + 1
+    assert snapshot.data == {'current_discount': None, 'count': 0}
+    assert store.snapshot() is snapshot
+
+
+def test_compare_and_set_rejects_stale_version():
+    store = StateStore({'current_discount': None})
+    read = store.snapshot()
+    store.update(current_discount='DESC-20')  # escaneo entre lectura y limpieza
+
+    ok, snapshot = store.compare_and_set(read.version, current_discount=None)
+
+    assert not ok
+    assert snapshot.data['current_discount'] == 'DESC-20'
+    assert store.snapshot() is snapshot
+
+
+def test_snapshots_are_immutable():
+    store = StateStore({'a': 1})
+    old = store.snapshot()
+    store.update(a=2)
+    assert old.data['a'] == 1
+    with pytest.raises(TypeError):
+        old.data['a'] = 3
+
+
+def test_update_with_function_is_atomic():
+    store = StateStore({'count': 0})
+
+    def bump():
+        for _ in range(500):
+            store.update(lambda data: {'count': data['count'] + 1})
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.snapshot().data['count'] == 2000
+    assert store.snapshot().version == 2000
+
+
+def test_only_one_concurrent_cas_wins():
+    store = StateStore({'current_discount': 'DESC-10'})
+    version = store.snapshot().version
+    results = []
+    barrier = threading.Barrier(8)
+
+    def clear():
+        barrier.wait()
+        results.append(store.compare_and_set(version, current_discount=None)[0])
+
+    threads = [threading.Thread(target=clear) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1